@@ -0,0 +1,241 @@
+"""
+Monte Carlo bankroll and risk-of-ruin simulator for Hi-Lo bet spreads.
+
+Each trajectory plays through shuffled shoes. The Hi-Lo running count is
+taken from the actual shuffled cards at every hand boundary (heads-up,
+CARDS_PER_HAND cards per round), converted to a floored true count, and
+the bet comes from the ramp. Hand results are drawn from a fixed
+basic-strategy outcome distribution whose mean is shifted to the
+count-dependent edge (rule-adjusted base edge + EDGE_PER_TRUE_COUNT per
+true count), i.e. a count-conditional model rather than hand-by-hand play.
+
+Trajectories are simulated in numpy batches, split into chunks that run
+on a process pool, and results are memoized by a hash of the inputs.
+"""
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+CARDS_PER_HAND = 5.4
+EDGE_PER_TRUE_COUNT = 0.005
+CHUNK_TRAJECTORIES = 250
+MAX_TOTAL_HANDS = 50_000_000
+
+# Per-unit hand results for basic strategy: blackjack, doubled/split win,
+# win, push, loss, doubled/split loss
+OUTCOME_VALUES = [1.5, 2.0, 1.0, 0.0, -1.0, -2.0]
+OUTCOME_PROBS = [0.045, 0.06, 0.33, 0.085, 0.44, 0.04]
+WIN_INDEX, LOSS_INDEX = 2, 4
+
+# Off-the-top player edge relative to 6D S17 DAS 3:2 no surrender
+BASE_EDGE = -0.005
+DECK_EDGE = {1: 0.0048, 2: 0.0019, 3: 0.0010, 4: 0.0006, 5: 0.0003, 6: 0.0, 7: -0.0001, 8: -0.0002}
+
+
+class BetStep(BaseModel):
+    true_count: int
+    units: float = Field(gt=0)
+
+
+class SimulationParams(BaseModel):
+    num_decks: int = Field(6, ge=1, le=8)
+    penetration: float = Field(0.75, ge=0.5, le=0.95)
+    dealer_hits_soft17: bool = False
+    double_after_split: bool = True
+    allow_surrender: bool = True
+    blackjack_payout: float = Field(1.5, ge=1.0, le=1.5)
+    bet_ramp: List[BetStep] = Field(min_length=1, max_length=40)
+    unit_size: float = Field(10.0, gt=0)
+    bankroll: float = Field(gt=0)
+    hands: int = Field(10000, ge=100, le=200000)
+    trajectories: int = Field(1000, ge=10, le=20000)
+    seed: int = 0
+
+    @field_validator("bet_ramp")
+    @classmethod
+    def sort_ramp(cls, ramp: List[BetStep]) -> List[BetStep]:
+        return sorted(ramp, key=lambda step: step.true_count)
+
+    @model_validator(mode="after")
+    def check_workload(self) -> "SimulationParams":
+        if self.hands * self.trajectories > MAX_TOTAL_HANDS:
+            raise ValueError(f"hands * trajectories must not exceed {MAX_TOTAL_HANDS}")
+        return self
+
+
+def input_hash(params: SimulationParams) -> str:
+    """Stable hash of the simulation inputs"""
+    canonical = json.dumps(params.model_dump(), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def base_edge(params: SimulationParams) -> float:
+    """Off-the-top player edge for the table rules"""
+    edge = BASE_EDGE + DECK_EDGE[params.num_decks]
+    if params.dealer_hits_soft17:
+        edge -= 0.0022
+    if not params.double_after_split:
+        edge -= 0.0014
+    if params.allow_surrender:
+        edge += 0.0008
+    # 4.5% of hands are naturals, each losing the payout shortfall
+    edge -= 0.045 * (1.5 - params.blackjack_payout)
+    return edge
+
+
+def _simulate_chunk(params: Dict[str, Any], trajectories: int, seed_seq) -> Dict[str, Any]:
+    """Simulate one batch of trajectories; runs in a worker process"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed_seq)
+    num_decks = params["num_decks"]
+    total_cards = 52 * num_decks
+    hands_per_shoe = max(1, int(params["penetration"] * total_cards / CARDS_PER_HAND))
+    unit = params["unit_size"]
+
+    # Hi-Lo tags for one shoe: 2-6 +1, 7-9 0, T-A -1 (per suit-rank)
+    deck = np.array([1] * 5 + [0] * 3 + [-1] * 5, dtype=np.int8)
+    shoe = np.tile(np.repeat(deck, 4), num_decks)
+
+    boundaries = np.round(np.arange(hands_per_shoe) * CARDS_PER_HAND).astype(np.int64)
+    decks_left = np.maximum((total_cards - boundaries) / 52.0, 0.5)
+
+    ramp_counts = np.array([step["true_count"] for step in params["bet_ramp"]])
+    ramp_units = np.array([step["units"] for step in params["bet_ramp"]])
+
+    values = np.array(OUTCOME_VALUES)
+    probs = np.array(OUTCOME_PROBS)
+    base_mean = float(values @ probs)
+    edge0 = params["base_edge"]
+
+    bankroll = np.full(trajectories, float(params["bankroll"]))
+    ruined = np.zeros(trajectories, dtype=bool)
+    total = total_sq = wagered = 0.0
+    hands_done = 0
+
+    while hands_done < params["hands"]:
+        n = min(hands_per_shoe, params["hands"] - hands_done)
+        shuffled = rng.permuted(np.broadcast_to(shoe, (trajectories, total_cards)), axis=1)
+        running = np.concatenate(
+            [np.zeros((trajectories, 1), dtype=np.int32), np.cumsum(shuffled, axis=1, dtype=np.int32)],
+            axis=1
+        )[:, boundaries[:n]]
+        exact_count = running / decks_left[:n]
+
+        # Bets use the floored true count, the edge uses the exact one
+        step = np.searchsorted(ramp_counts, np.floor(exact_count), side="right") - 1
+        bets = ramp_units[np.maximum(step, 0)] * unit
+
+        # Move probability between win and loss so the mean hits the count's edge
+        shift = (edge0 + EDGE_PER_TRUE_COUNT * exact_count - base_mean) / 2
+        idx = np.searchsorted(np.cumsum(probs), rng.random((trajectories, n)), side="right")
+        idx = idx.clip(max=len(values) - 1)
+        result = values[idx]
+        # Turn a slice of losses into wins (or wins into losses) to apply the shift
+        p_flip = np.where(shift > 0, shift / probs[LOSS_INDEX], -shift / probs[WIN_INDEX])
+        flip = rng.random((trajectories, n)) < p_flip
+        to_win = flip & (shift > 0) & (idx == LOSS_INDEX)
+        to_loss = flip & (shift < 0) & (idx == WIN_INDEX)
+        result = np.where(to_win, 1.0, np.where(to_loss, -1.0, result))
+
+        money = result * bets
+        total += float(money.sum())
+        total_sq += float((money ** 2).sum())
+        wagered += float(bets.sum())
+
+        # Ruin is sticky: once a trajectory touches zero it stops playing
+        path = bankroll[:, None] + np.cumsum(np.where(ruined[:, None], 0.0, money), axis=1)
+        ruined |= path.min(axis=1) <= 0
+        bankroll = np.where(ruined, 0.0, path[:, -1])
+        hands_done += n
+
+    return {
+        "final_bankrolls": bankroll.tolist(),
+        "ruined": int(ruined.sum()),
+        "total": total,
+        "total_sq": total_sq,
+        "wagered": wagered,
+        "hands": trajectories * params["hands"],
+    }
+
+
+def _summarize(params: SimulationParams, chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    import numpy as np
+
+    hands = sum(c["hands"] for c in chunks)
+    ev = sum(c["total"] for c in chunks) / hands
+    variance = sum(c["total_sq"] for c in chunks) / hands - ev ** 2
+    sd = math.sqrt(max(variance, 0.0))
+    finals = np.concatenate([np.array(c["final_bankrolls"]) for c in chunks])
+
+    lifetime_ror = None
+    if variance > 0:
+        lifetime_ror = 1.0 if ev <= 0 else math.exp(-2 * ev * params.bankroll / variance)
+
+    return {
+        "risk_of_ruin": sum(c["ruined"] for c in chunks) / params.trajectories,
+        "risk_of_ruin_lifetime": lifetime_ror,
+        "ev_per_hand": ev,
+        "win_rate_per_100": ev * 100,
+        "sd_per_100": sd * 10,
+        "n0": variance / ev ** 2 if ev > 0 else None,
+        "average_bet": sum(c["wagered"] for c in chunks) / hands,
+        "base_edge": base_edge(params),
+        "final_bankroll": {
+            "p5": float(np.percentile(finals, 5)),
+            "median": float(np.median(finals)),
+            "p95": float(np.percentile(finals, 95)),
+        },
+        "trajectories": params.trajectories,
+        "hands": params.hands,
+    }
+
+
+def simulate(params: SimulationParams, executor: Optional[Executor] = None) -> Dict[str, Any]:
+    """Run the simulation, spreading trajectory chunks over `executor`"""
+    import numpy as np
+
+    payload = params.model_dump()
+    payload["base_edge"] = base_edge(params)
+
+    sizes = [CHUNK_TRAJECTORIES] * (params.trajectories // CHUNK_TRAJECTORIES)
+    if params.trajectories % CHUNK_TRAJECTORIES:
+        sizes.append(params.trajectories % CHUNK_TRAJECTORIES)
+    seeds = np.random.SeedSequence(params.seed).spawn(len(sizes))
+
+    if executor is None:
+        chunks = [_simulate_chunk(payload, size, seed) for size, seed in zip(sizes, seeds)]
+    else:
+        futures = [executor.submit(_simulate_chunk, payload, size, seed) for size, seed in zip(sizes, seeds)]
+        chunks = [future.result() for future in futures]
+
+    return {"input_hash": input_hash(params), **_summarize(params, chunks)}
+
+
+class SimulationCache:
+    """Bounded in-process memo of simulation results keyed by input hash"""
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+            return result
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
@@ -0,0 +1,80 @@
+"""
+Size and speed of the binary hand encoding vs. JSON and BSON.
+
+    cd backend && python -m benchmarks.bench_hand_codec [num_hands]
+"""
+import json
+import random
+import sys
+import time
+
+from hand_codec import RANKS, SUITS, decode_hands, encode_hands
+
+ACTIONS = ["HIT", "STAND", "DOUBLE", "SPLIT", "SURRENDER"]
+OUTCOMES = ["WIN", "LOSE", "PUSH", "BLACKJACK", "BUST", "SURRENDER"]
+
+
+def random_card(rng):
+    value, symbol = rng.choice(RANKS)
+    return {"rank": {"value": value, "symbol": symbol}, "suit": rng.choice(SUITS)}
+
+
+def sample_hands(count=200, seed=7):
+    """Assumed hand records, newest first.
+
+    The frontend does not write hand history yet, so this shape (cards in
+    its Card form, outcome, bet/payout, counts, bankrollAfter) is a guess,
+    not a sample of real uploads.
+    """
+    rng = random.Random(seed)
+    timestamp = 1769731200000
+    hands = []
+    for _ in range(count):
+        timestamp -= rng.randint(4000, 90000)
+        bet = rng.choice([10, 20, 25, 50, 100])
+        outcome = rng.choice(OUTCOMES)
+        hands.append({
+            "timestamp": timestamp,
+            "playerCards": [random_card(rng) for _ in range(rng.randint(2, 4))],
+            "dealerCards": [random_card(rng) for _ in range(rng.randint(2, 4))],
+            "bet": bet,
+            "result": outcome,
+            "payout": bet if outcome == "WIN" else -bet,
+            "actions": [rng.choice(ACTIONS) for _ in range(rng.randint(1, 3))],
+            "runningCount": rng.randint(-12, 12),
+            "trueCount": round(rng.uniform(-4, 4), 1),
+            "isSplitChild": rng.random() < 0.05,
+            "bankrollAfter": rng.randint(500, 1500),
+        })
+    return hands
+
+
+def timed(fn, repeat=200):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main(num_hands=200):
+    import bson
+
+    hands = sample_hands(num_hands)
+    json_bytes = json.dumps(hands, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    bson_bytes = bson.encode({"hands": hands})
+    blob = encode_hands(hands)
+    assert decode_hands(blob) == hands
+
+    print(f"{num_hands} hands")
+    print(f"  JSON   {len(json_bytes):>8} bytes")
+    print(f"  BSON   {len(bson_bytes):>8} bytes")
+    print(f"  binary {len(blob):>8} bytes  "
+          f"({len(json_bytes) / len(blob):.1f}x smaller than JSON, "
+          f"{len(bson_bytes) / len(blob):.1f}x smaller than BSON)")
+    print(f"  encode {timed(lambda: encode_hands(hands)):8.0f} us   "
+          f"decode {timed(lambda: decode_hands(blob)):8.0f} us   "
+          f"json.dumps {timed(lambda: json.dumps(hands)):8.0f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,67 @@
+"""
+Cost of validating a sync upload: typed SyncData vs. the unbounded
+Dict[str, Any] model it replaced, both parsed with model_validate_json.
+
+    cd backend && python -m benchmarks.bench_sync_payloads [num_hands]
+"""
+import json
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+from benchmarks.bench_hand_codec import sample_hands
+from sync_payloads import SyncData
+
+
+class UnboundedSyncData(BaseModel):
+    """SyncData as it was before the caps"""
+    game_stats: Optional[Dict[str, Any]] = None
+    strategy_stats: Optional[Dict[str, Any]] = None
+    training_stats: Optional[Dict[str, Any]] = None
+    hands: Optional[List[Dict[str, Any]]] = None
+    settings: Optional[Dict[str, Any]] = None
+
+
+def sample_body(num_hands=200):
+    mistakes = {f"{total}_vs_{up}": {"wrong": 3, "correct": "HIT"} for total in range(5, 21) for up in range(2, 12)}
+    return json.dumps({
+        "game_stats": {"handsPlayed": 1200, "handsWon": 540, "totalWagered": 31000.0},
+        "strategy_stats": {"totalDecisions": 3000, "commonMistakes": mistakes},
+        "training_stats": {},
+        "hands": sample_hands(num_hands),
+        "settings": {"numDecks": 6, "dealerHitsSoft17": False},
+    }).encode("utf-8")
+
+
+def read_chunks(body, chunk_size=65536):
+    """What read_json_body does before validating: collect the chunks"""
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    return b"".join(chunks)
+
+
+def best_ms(fn, repeat=300):
+    """Fastest of `repeat` runs; less sensitive to a noisy machine than the median"""
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main(num_hands=200):
+    body = sample_body(num_hands)
+    assert SyncData.model_validate_json(body).hands == json.loads(body)["hands"]
+
+    print(f"{num_hands} hands, {len(body)} bytes (best of 300)")
+    print(f"  json.loads                          {best_ms(lambda: json.loads(body)):6.2f} ms")
+    print(f"  unbounded model_validate_json       {best_ms(lambda: UnboundedSyncData.model_validate_json(body)):6.2f} ms")
+    print(f"  typed SyncData model_validate_json  "
+          f"{best_ms(lambda: SyncData.model_validate_json(read_chunks(body))):6.2f} ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
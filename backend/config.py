@@ -0,0 +1,86 @@
+"""
+Runtime settings for the Blackjack Trainer API
+"""
+import os
+from pathlib import Path
+from typing import List, Optional
+
+from dotenv import load_dotenv
+from pydantic import BaseModel
+
+ROOT_DIR = Path(__file__).parent
+
+
+class Settings(BaseModel):
+    mongo_url: str
+    db_name: str
+    cors_origins: List[str] = ["*"]
+    auth_service_url: str = "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data"
+
+    # Mongo pool
+    mongo_min_pool_size: int = 10
+    mongo_max_pool_size: int = 100
+    mongo_timeout_ms: int = 5000
+
+    # Outbound HTTP
+    http_timeout: float = 10.0
+
+    # Heartbeat buffering
+    heartbeat_flush_interval: float = 1.0
+    heartbeat_max_batch: int = 500
+    heartbeat_max_pending: int = 10000
+
+    # Largest accepted sync upload (stats + hand history)
+    sync_max_body_bytes: int = 1024 * 1024
+
+    # Per-user document cache
+    user_cache_enabled: bool = True
+    user_cache_max_bytes: int = 64 * 1024 * 1024
+    user_cache_ttl: float = 60.0
+
+    # Bankroll simulator
+    sim_workers: int = 0
+    sim_cache_size: int = 128
+
+    # Readiness probe
+    ready_timeout: float = 2.0
+
+    # Admin and profiling
+    admin_token: Optional[str] = None
+    profile_sample_rate: float = 0.0
+    profile_slow_ms: float = 0.0
+    profile_buffer_size: int = 50
+    profile_interval_ms: float = 5.0
+
+    @classmethod
+    def from_env(cls, env_file: Optional[Path] = ROOT_DIR / '.env') -> "Settings":
+        """Build settings from the process environment (and .env if present)"""
+        if env_file is not None:
+            load_dotenv(env_file)
+        env = os.environ
+        defaults = cls.model_fields
+        return cls(
+            mongo_url=env['MONGO_URL'],
+            db_name=env['DB_NAME'],
+            cors_origins=env.get('CORS_ORIGINS', '*').split(','),
+            auth_service_url=env.get('AUTH_SERVICE_URL', defaults['auth_service_url'].default),
+            mongo_min_pool_size=int(env.get('MONGO_MIN_POOL_SIZE', defaults['mongo_min_pool_size'].default)),
+            mongo_max_pool_size=int(env.get('MONGO_MAX_POOL_SIZE', defaults['mongo_max_pool_size'].default)),
+            mongo_timeout_ms=int(env.get('MONGO_TIMEOUT_MS', defaults['mongo_timeout_ms'].default)),
+            http_timeout=float(env.get('HTTP_TIMEOUT', defaults['http_timeout'].default)),
+            heartbeat_flush_interval=float(env.get('HEARTBEAT_FLUSH_INTERVAL', defaults['heartbeat_flush_interval'].default)),
+            heartbeat_max_batch=int(env.get('HEARTBEAT_MAX_BATCH', defaults['heartbeat_max_batch'].default)),
+            heartbeat_max_pending=int(env.get('HEARTBEAT_MAX_PENDING', defaults['heartbeat_max_pending'].default)),
+            sync_max_body_bytes=int(env.get('SYNC_MAX_BODY_BYTES', defaults['sync_max_body_bytes'].default)),
+            user_cache_enabled=env.get('USER_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes'),
+            user_cache_max_bytes=int(env.get('USER_CACHE_MAX_BYTES', defaults['user_cache_max_bytes'].default)),
+            user_cache_ttl=float(env.get('USER_CACHE_TTL', defaults['user_cache_ttl'].default)),
+            sim_workers=int(env.get('SIM_WORKERS', defaults['sim_workers'].default)),
+            sim_cache_size=int(env.get('SIM_CACHE_SIZE', defaults['sim_cache_size'].default)),
+            ready_timeout=float(env.get('READY_TIMEOUT', defaults['ready_timeout'].default)),
+            admin_token=env.get('ADMIN_TOKEN') or None,
+            profile_sample_rate=float(env.get('PROFILE_SAMPLE_RATE', 0)),
+            profile_slow_ms=float(env.get('PROFILE_SLOW_MS', 0)),
+            profile_buffer_size=int(env.get('PROFILE_BUFFER_SIZE', defaults['profile_buffer_size'].default)),
+            profile_interval_ms=float(env.get('PROFILE_INTERVAL_MS', defaults['profile_interval_ms'].default)),
+        )
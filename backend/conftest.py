@@ -0,0 +1,129 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+# Make backend modules importable from tests/
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def matches(doc, query):
+    """Whether a document satisfies a query of equality, $ne, $lt and $exists terms"""
+    for key, expected in query.items():
+        if isinstance(expected, dict) and "$ne" in expected:
+            if doc.get(key) == expected["$ne"]:
+                return False
+        elif isinstance(expected, dict) and "$lt" in expected:
+            if key not in doc or not doc[key] < expected["$lt"]:
+                return False
+        elif isinstance(expected, dict) and "$exists" in expected:
+            if (key in doc) != expected["$exists"]:
+                return False
+        elif doc.get(key) != expected:
+            return False
+    return True
+
+
+class MemoryCollection:
+    """Just enough of a Motor collection for the login and sync write paths.
+
+    `unique` names a field with a unique index: an upsert that would
+    insert a second document with the same value raises DuplicateKeyError.
+    """
+
+    def __init__(self, docs=None, unique=None, duplicate_errors=0):
+        self.docs = [dict(doc) for doc in docs or []]
+        self.unique = unique
+        self.duplicate_errors = duplicate_errors
+        self.calls = []
+
+    def get(self, **query):
+        """First stored document matching `query` (test helper, not Motor API)"""
+        return next((d for d in self.docs if matches(d, query)), None)
+
+    def _insert(self, query, fields):
+        from pymongo.errors import DuplicateKeyError
+
+        doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+        doc.update(fields)
+        if self.unique and any(d.get(self.unique) == doc.get(self.unique) for d in self.docs):
+            raise DuplicateKeyError("E11000 duplicate key")
+        self.docs.append(doc)
+        return doc
+
+    async def find_one(self, query, projection=None):
+        doc = self.get(**query)
+        return dict(doc) if doc else None
+
+    async def update_one(self, query, update, upsert=False):
+        self.calls.append(("update_one", query, update))
+        doc = self.get(**query)
+        if doc is not None:
+            doc.update(update.get("$set", {}))
+            for name in update.get("$unset", {}):
+                doc.pop(name, None)
+            return SimpleNamespace(matched_count=1, modified_count=1)
+        if upsert:
+            self._insert(query, update.get("$set", {}))
+        return SimpleNamespace(matched_count=0, modified_count=0)
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=None):
+        from pymongo.errors import DuplicateKeyError
+
+        self.calls.append(("find_one_and_update", query, update))
+        if self.duplicate_errors:
+            self.duplicate_errors -= 1
+            raise DuplicateKeyError("E11000 duplicate key")
+        doc = self.get(**query)
+        if doc is None:
+            doc = self._insert(query, update["$setOnInsert"])
+        doc.update(update["$set"])
+        return dict(doc)
+
+    async def replace_one(self, query, replacement, upsert=False):
+        self.calls.append(("replace_one", query, replacement))
+        self.docs = [d for d in self.docs if not matches(d, query)] + [dict(replacement)]
+
+    async def delete_many(self, query):
+        self.calls.append(("delete_many", query))
+        self.docs = [d for d in self.docs if not matches(d, query)]
+
+
+class MemoryDb(dict):
+    """Collections by name, reachable as items or attributes like a Motor database"""
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+@pytest.fixture
+def memory_collection():
+    """Factory for in-memory collections"""
+    return MemoryCollection
+
+
+@pytest.fixture
+def memory_db():
+    """Factory for in-memory databases: memory_db(users=..., stats=...)"""
+    return MemoryDb
+
+
+@pytest.fixture
+def unreachable_settings():
+    """Factory for settings pointing at closed ports so nothing leaves the machine"""
+    from config import Settings
+
+    def make(**overrides):
+        values = dict(
+            mongo_url="mongodb://127.0.0.1:1",
+            db_name="test_database",
+            auth_service_url="http://127.0.0.1:1/",
+            mongo_timeout_ms=200,
+            http_timeout=0.5,
+            ready_timeout=0.5,
+        )
+        values.update(overrides)
+        return Settings(**values)
+
+    return make
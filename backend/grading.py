@@ -0,0 +1,396 @@
+"""
+Vectorized decision grading against basic strategy and Hi-Lo deviations.
+
+Mirrors getOptimalAction/evaluateAction in frontend/src/lib/basicStrategy.js
+(same charts, same Illustrious 18 / Fab 4 entries, same precedence:
+deviation, surrender deviation, pairs, soft, hard) so a decision graded
+here gets the verdict the player saw in the browser. The charts are
+resolved once per rule-flag combination into lookup arrays, and a batch
+of decisions is graded with array indexing instead of per-hand branching.
+
+regrade_histories() re-scores the decisions stored in hand histories; it
+is a plain function over picklable documents so chunks can run on a
+process pool.
+"""
+import math
+from datetime import datetime, timezone
+from typing import Annotated, Any, Dict, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel, BeforeValidator, Field
+
+from hand_codec import decode_hands, encode_hands
+
+ACTIONS = ["HIT", "STAND", "DOUBLE", "SPLIT", "SURRENDER"]
+HIT, STAND, DOUBLE, SPLIT, SURRENDER = range(5)
+_ACTION_INDEX = {action: i for i, action in enumerate(ACTIONS)}
+
+SYMBOL_VALUES = {
+    "2": 2, "3": 3, "4": 4, "5": 5, "6": 6, "7": 7, "8": 8, "9": 9,
+    "10": 10, "J": 10, "Q": 10, "K": 10, "A": 11,
+}
+_SYMBOL_CODES = {symbol: i + 1 for i, symbol in enumerate(SYMBOL_VALUES)}
+
+# Charts indexed [row][dealer upcard 2..A], copied from basicStrategy.js
+HARD_TOTALS = {
+    5: ["H", "H", "H", "H", "H", "H", "H", "H", "H", "H"],
+    6: ["H", "H", "H", "H", "H", "H", "H", "H", "H", "H"],
+    7: ["H", "H", "H", "H", "H", "H", "H", "H", "H", "H"],
+    8: ["H", "H", "H", "H", "H", "H", "H", "H", "H", "H"],
+    9: ["H", "D", "D", "D", "D", "H", "H", "H", "H", "H"],
+    10: ["D", "D", "D", "D", "D", "D", "D", "D", "H", "H"],
+    11: ["D", "D", "D", "D", "D", "D", "D", "D", "D", "D"],
+    12: ["H", "H", "S", "S", "S", "H", "H", "H", "H", "H"],
+    13: ["S", "S", "S", "S", "S", "H", "H", "H", "H", "H"],
+    14: ["S", "S", "S", "S", "S", "H", "H", "H", "H", "H"],
+    15: ["S", "S", "S", "S", "S", "H", "H", "H", "Rh", "Rh"],
+    16: ["S", "S", "S", "S", "S", "H", "H", "Rh", "Rh", "Rh"],
+    17: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "Rs"],
+    18: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "S"],
+    19: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "S"],
+    20: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "S"],
+    21: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "S"],
+}
+
+SOFT_TOTALS = {
+    13: ["H", "H", "H", "D", "D", "H", "H", "H", "H", "H"],
+    14: ["H", "H", "H", "D", "D", "H", "H", "H", "H", "H"],
+    15: ["H", "H", "D", "D", "D", "H", "H", "H", "H", "H"],
+    16: ["H", "H", "D", "D", "D", "H", "H", "H", "H", "H"],
+    17: ["H", "D", "D", "D", "D", "H", "H", "H", "H", "H"],
+    18: ["Ds", "Ds", "Ds", "Ds", "Ds", "S", "S", "H", "H", "H"],
+    19: ["S", "S", "S", "S", "Ds", "S", "S", "S", "S", "S"],
+    20: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "S"],
+    21: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "S"],
+}
+
+PAIRS = {
+    2: ["Ph", "Ph", "P", "P", "P", "P", "H", "H", "H", "H"],
+    3: ["Ph", "Ph", "P", "P", "P", "P", "H", "H", "H", "H"],
+    4: ["H", "H", "H", "Ph", "Ph", "H", "H", "H", "H", "H"],
+    5: ["D", "D", "D", "D", "D", "D", "D", "D", "H", "H"],
+    6: ["Ph", "P", "P", "P", "P", "H", "H", "H", "H", "H"],
+    7: ["P", "P", "P", "P", "P", "P", "H", "H", "H", "H"],
+    8: ["P", "P", "P", "P", "P", "P", "P", "P", "P", "Rp"],
+    9: ["P", "P", "P", "P", "P", "S", "P", "P", "S", "S"],
+    10: ["S", "S", "S", "S", "S", "S", "S", "S", "S", "S"],
+    11: ["P", "P", "P", "P", "P", "P", "P", "P", "P", "P"],
+}
+
+# Play deviations: (total, dealer value, threshold, at-or-above, action)
+DEVIATIONS = [
+    (16, 10, 0, True, STAND),
+    (15, 10, 4, True, STAND),
+    (12, 3, 2, True, STAND),
+    (12, 2, 3, True, STAND),
+    (13, 2, -1, False, HIT),
+    (16, 9, 5, True, STAND),
+]
+
+# Surrender deviations (Fab 4): (total, dealer value, threshold)
+SURRENDER_DEVIATIONS = [
+    (14, 10, 3),
+    (15, 9, 2),
+    (15, 11, 1),
+    (14, 11, 3),
+]
+
+MAX_CARDS = 12
+TABLE_HARD, TABLE_SOFT, TABLE_PAIR = range(3)
+
+CardSymbol = Literal["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+Action = Annotated[
+    Literal["HIT", "STAND", "DOUBLE", "SPLIT", "SURRENDER"],
+    BeforeValidator(lambda v: v.upper() if isinstance(v, str) else v),
+]
+
+
+class GradeItem(BaseModel):
+    player_cards: List[CardSymbol] = Field(min_length=1, max_length=MAX_CARDS)
+    dealer_upcard: CardSymbol
+    action: Action
+    true_count: Optional[float] = None
+    can_double: Optional[bool] = None
+    can_split: Optional[bool] = None
+    can_surrender: bool = True
+    show_deviations: bool = True
+
+
+class GradeRequest(BaseModel):
+    decisions: List[GradeItem] = Field(min_length=1, max_length=10000)
+
+
+def _resolve(code: str, can_double: bool, can_surrender: bool, can_split: bool) -> int:
+    """Same as resolveAction() in basicStrategy.js"""
+    if code == "H":
+        return HIT
+    if code == "S":
+        return STAND
+    if code == "D":
+        return DOUBLE if can_double else HIT
+    if code == "Ds":
+        return DOUBLE if can_double else STAND
+    if code in ("P", "Ph"):
+        return SPLIT if can_split else HIT
+    if code == "Rh":
+        return SURRENDER if can_surrender else HIT
+    if code == "Rs":
+        return SURRENDER if can_surrender else STAND
+    if code == "Rp":
+        return SURRENDER if can_surrender else (SPLIT if can_split else HIT)
+    return STAND
+
+
+_tables = None
+
+
+def lookup_tables():
+    """Chart and deviation arrays, built once per process"""
+    global _tables
+    if _tables is not None:
+        return _tables
+    import numpy as np
+
+    # [table, row, dealer index, can_double, can_surrender, can_split]
+    charts = np.full((3, 22, 10, 2, 2, 2), STAND, dtype=np.int8)
+    for kind, chart, split_allowed in (
+        (TABLE_HARD, HARD_TOTALS, False),
+        (TABLE_SOFT, SOFT_TOTALS, False),
+        (TABLE_PAIR, PAIRS, True),
+    ):
+        for row, codes in chart.items():
+            for dealer, code in enumerate(codes):
+                for d in (0, 1):
+                    for r in (0, 1):
+                        for p in (0, 1):
+                            charts[kind, row, dealer, d, r, p] = _resolve(
+                                code, bool(d), bool(r), bool(p) and split_allowed
+                            )
+
+    # [total, dealer value]; NaN threshold means no deviation
+    dev_threshold = np.full((22, 12), np.nan)
+    dev_above = np.zeros((22, 12), dtype=bool)
+    dev_action = np.full((22, 12), STAND, dtype=np.int8)
+    for total, dealer, threshold, above, action in DEVIATIONS:
+        if np.isnan(dev_threshold[total, dealer]):
+            dev_threshold[total, dealer] = threshold
+            dev_above[total, dealer] = above
+            dev_action[total, dealer] = action
+
+    surr_threshold = np.full((22, 12), np.nan)
+    for total, dealer, threshold in SURRENDER_DEVIATIONS:
+        if np.isnan(surr_threshold[total, dealer]):
+            surr_threshold[total, dealer] = threshold
+
+    _tables = (charts, dev_threshold, dev_above, dev_action, surr_threshold)
+    return _tables
+
+
+def card_symbol(card: Any) -> str:
+    """Rank symbol from a symbol string or a frontend Card dict"""
+    if isinstance(card, dict):
+        rank = card.get("rank")
+        if isinstance(rank, dict):
+            return str(rank.get("symbol"))
+        return str(card.get("symbol", rank))
+    return str(card)
+
+
+def grade(items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Grade a batch of decisions.
+
+    Each item has player_cards, dealer_upcard, action and optionally
+    true_count, can_double, can_split, can_surrender, show_deviations.
+    Returns parallel lists: optimal_action, is_correct, is_deviation.
+    """
+    import numpy as np
+
+    charts, dev_threshold, dev_above, dev_action, surr_threshold = lookup_tables()
+    n = len(items)
+    codes = np.zeros((n, MAX_CARDS), dtype=np.int8)
+    values = np.zeros((n, MAX_CARDS), dtype=np.int16)
+    dealer = np.zeros(n, dtype=np.int16)
+    true_count = np.full(n, np.nan)
+    can_double = np.zeros(n, dtype=bool)
+    can_split = np.zeros(n, dtype=bool)
+    can_surrender = np.zeros(n, dtype=bool)
+    show_dev = np.zeros(n, dtype=bool)
+    chosen = np.full(n, -1, dtype=np.int8)
+
+    for i, item in enumerate(items):
+        symbols = [card_symbol(card) for card in item["player_cards"][:MAX_CARDS]]
+        for j, symbol in enumerate(symbols):
+            codes[i, j] = _SYMBOL_CODES.get(symbol, 0)
+            values[i, j] = SYMBOL_VALUES.get(symbol, 0)
+        dealer[i] = SYMBOL_VALUES.get(card_symbol(item["dealer_upcard"]), 0)
+        tc = item.get("true_count")
+        if tc is not None and not (isinstance(tc, float) and math.isnan(tc)):
+            true_count[i] = tc
+        split_flag = item.get("can_split")
+        if split_flag is None:
+            # gameLogic.canSplit: two cards of the same rank or both ten-valued
+            split_flag = len(symbols) == 2 and (
+                symbols[0] == symbols[1] or SYMBOL_VALUES.get(symbols[0]) == SYMBOL_VALUES.get(symbols[1]) == 10
+            )
+        double_flag = item.get("can_double")
+        # useGameState passes canDouble only for two-card hands
+        can_double[i] = len(symbols) == 2 if double_flag is None else double_flag
+        can_split[i] = split_flag
+        can_surrender[i] = item.get("can_surrender", True)
+        show_dev[i] = item.get("show_deviations", True)
+        chosen[i] = _ACTION_INDEX.get(str(item.get("action", "")).upper(), -1)
+
+    # Totals with aces counted as 1 as needed
+    raw = values.sum(axis=1)
+    aces = (values == 11).sum(axis=1)
+    reduce = np.clip(np.ceil((raw - 21) / 10), 0, aces).astype(np.int16)
+    total = raw - 10 * reduce
+    soft = (aces - reduce > 0) & (total <= 21)
+    n_cards = (codes > 0).sum(axis=1)
+    pair = (n_cards == 2) & (codes[:, 0] == codes[:, 1]) & (codes[:, 0] > 0)
+    pair_value = values[:, 0]
+
+    dealer_idx = np.where(dealer == 11, 9, np.clip(dealer, 2, 10) - 2)
+    dealer_col = np.clip(dealer, 0, 11)
+    d, r, p = can_double.astype(int), can_surrender.astype(int), can_split.astype(int)
+
+    hard_row = np.clip(total, 5, 21)
+    base = charts[TABLE_HARD, hard_row, dealer_idx, d, r, 0]
+    use_soft = soft & (total >= 13) & (total <= 21)
+    base = np.where(use_soft, charts[TABLE_SOFT, np.clip(total, 0, 21), dealer_idx, d, r, 0], base)
+    use_pair = pair & can_split & (pair_value >= 2)
+    base = np.where(use_pair, charts[TABLE_PAIR, np.clip(pair_value, 0, 21), dealer_idx, d, r, p], base)
+
+    # Count-based deviations take precedence, play deviations first
+    has_tc = show_dev & ~np.isnan(true_count)
+    dev_total = np.clip(total, 0, 21)
+    thr = dev_threshold[dev_total, dealer_col]
+    with np.errstate(invalid="ignore"):
+        dev_hit = has_tc & ~np.isnan(thr) & np.where(
+            dev_above[dev_total, dealer_col], true_count >= thr, true_count <= thr
+        )
+        sthr = surr_threshold[dev_total, dealer_col]
+        surr_hit = has_tc & can_surrender & ~np.isnan(sthr) & (true_count >= sthr) & ~dev_hit
+
+    optimal = np.where(dev_hit, dev_action[dev_total, dealer_col], np.where(surr_hit, SURRENDER, base))
+    is_deviation = dev_hit | surr_hit
+
+    return {
+        "optimal_action": [ACTIONS[a] for a in optimal],
+        "is_correct": (optimal == chosen).tolist(),
+        "is_deviation": is_deviation.tolist(),
+    }
+
+
+def _decision_item(decision: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Grading input for a decision stored in a hand, or None if incomplete or malformed"""
+    cards = decision.get("playerCards")
+    if not isinstance(cards, list) or not 0 < len(cards) <= MAX_CARDS:
+        return None
+    symbols = [card_symbol(card) for card in cards]
+    upcard = card_symbol(decision.get("dealerUpcard"))
+    action = decision.get("action") or decision.get("playerAction")
+    if not all(symbol in SYMBOL_VALUES for symbol in symbols) or upcard not in SYMBOL_VALUES:
+        return None
+    if not isinstance(action, str) or action.upper() not in _ACTION_INDEX:
+        return None
+    return {
+        "player_cards": symbols,
+        "dealer_upcard": upcard,
+        "action": action.upper(),
+        "true_count": decision.get("trueCount"),
+        "can_double": decision.get("canDouble"),
+        "can_split": decision.get("canSplit"),
+        "can_surrender": decision.get("canSurrender", True),
+    }
+
+
+def _mistake_key(item: Dict[str, Any]) -> str:
+    """Same key the frontend uses for strategy_stats.mistakes (validated symbols only)"""
+    symbols = item["player_cards"]
+    raw = sum(SYMBOL_VALUES[s] for s in symbols)
+    aces = symbols.count("A")
+    while raw > 21 and aces:
+        raw -= 10
+        aces -= 1
+    return f"{raw}_vs_{item['dealer_upcard']}"
+
+
+def regrade_histories(history_docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Re-score the decisions stored in a chunk of history documents.
+
+    Hands may carry `decisions: [{playerCards, dealerUpcard, trueCount,
+    action, canDouble, canSplit, canSurrender, isCorrect, optimalAction}]`.
+    Hands whose grades changed are stamped with `regradedAt`, so a later
+    sync carrying the client's stale copy of the hand does not replace
+    them. Returns one entry per user whose grades changed, with the
+    re-encoded history and the strategy_stats adjustments, and one entry
+    with an `error` per document that could not be re-scored.
+    """
+    results = []
+    for doc in history_docs:
+        try:
+            result = _regrade_history(doc)
+        except Exception as e:
+            result = {"user_id": doc.get("user_id"), "error": f"{type(e).__name__}: {e}"}
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def _regrade_history(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """regrade_histories() for one document; None when nothing changed"""
+    if doc.get("hands_blob") is not None:
+        hands = decode_hands(bytes(doc["hands_blob"]))
+    else:
+        hands = doc.get("hands") or []
+
+    refs: List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]] = []
+    for hand in hands:
+        decisions = hand.get("decisions") if isinstance(hand, dict) else None
+        if not isinstance(decisions, list):
+            continue
+        for decision in decisions:
+            item = _decision_item(decision) if isinstance(decision, dict) else None
+            if item is not None:
+                refs.append((hand, decision, item))
+    if not refs:
+        return None
+
+    graded = grade([item for _, _, item in refs])
+    regraded_at = datetime.now(timezone.utc).isoformat()
+    correct_delta = 0
+    mistakes: Dict[str, Dict[str, Any]] = {}
+    changed = 0
+    for (hand, decision, item), optimal, correct in zip(refs, graded["optimal_action"], graded["is_correct"]):
+        previous = decision.get("isCorrect")
+        if previous == correct and decision.get("optimalAction") == optimal:
+            continue
+        changed += 1
+        hand["regradedAt"] = regraded_at
+        decision["isCorrect"] = correct
+        decision["optimalAction"] = optimal
+        if previous is None or previous == correct:
+            continue
+        key = _mistake_key(item)
+        entry = mistakes.setdefault(key, {"count": 0, "correct": optimal, "wrong": item["action"]})
+        if correct:
+            correct_delta += 1
+            entry["count"] -= 1
+        else:
+            correct_delta -= 1
+            entry["count"] += 1
+
+    if not changed:
+        return None
+    return {
+        "user_id": doc["user_id"],
+        "updated_at": doc.get("updated_at"),
+        "regraded_at": regraded_at,
+        "hands_blob": encode_hands(hands),
+        "hand_count": len(hands),
+        "decisions_changed": changed,
+        "correct_delta": correct_delta,
+        "mistakes": {k: v for k, v in mistakes.items() if v["count"]},
+    }
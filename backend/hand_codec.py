@@ -0,0 +1,312 @@
+"""
+Compact binary encoding for stored hand history.
+
+A history blob is a version byte, a hand count and one record per hand.
+Each record starts with the hand's timestamp as a zigzag varint delta
+from the previous hand (histories are sorted newest first, so deltas are
+small), followed by the rest of the hand as a tagged value:
+
+- cards in the frontend's Card shape ({rank: {value, symbol}, suit})
+  become one byte (rank * 4 + suit), and lists of them a count + bytes
+- outcome/action/suit/rank strings and common dict keys are indexes
+  into fixed tables
+- ints are zigzag varints; anything else is stored generically, so
+  every JSON hand round-trips exactly
+
+The frontend does not upload hand history yet (addHandToHistory is never
+called), so the key table is a guess at the record shape: the only hand
+field the UI reads today is bankrollAfter. Unknown keys and values still
+round-trip, they just cost more bytes.
+
+The tables below are part of the format: only ever append to them.
+"""
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+
+FORMAT_VERSION = 1
+
+SUITS = ["♥", "♦", "♣", "♠"]
+RANKS = [
+    (2, "2"), (3, "3"), (4, "4"), (5, "5"), (6, "6"), (7, "7"), (8, "8"),
+    (9, "9"), (10, "10"), (10, "J"), (10, "Q"), (10, "K"), (11, "A"),
+]
+
+KEYS = [
+    "timestamp", "playerCards", "dealerCards", "cards", "result", "outcome",
+    "bet", "payout", "action", "actions", "trueCount", "runningCount",
+    "isSplitChild", "isSplit", "doubled", "insurance", "insuranceBet",
+    "handIndex", "bankroll", "correct", "isCorrect", "optimalAction",
+    "playerAction", "playerTotal", "dealerTotal", "isSoft", "isPair",
+    "decisions", "hands", "resolved", "surrendered", "mode", "rank", "suit",
+    "value", "symbol", "id", "bankrollAfter",
+    "regradedAt",
+]
+
+STRINGS = [
+    "WIN", "LOSE", "PUSH", "BLACKJACK", "BUST", "SURRENDER",
+    "HIT", "STAND", "DOUBLE", "SPLIT", "INSURANCE",
+    "win", "lose", "push", "blackjack", "bust", "surrender",
+    *SUITS,
+    "2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A",
+]
+
+_KEY_INDEX = {key: i for i, key in enumerate(KEYS)}
+_STRING_INDEX = {s: i for i, s in enumerate(STRINGS)}
+_RANK_INDEX = {rank: i for i, rank in enumerate(RANKS)}
+_SUIT_INDEX = {suit: i for i, suit in enumerate(SUITS)}
+
+# Value tags
+T_NULL, T_FALSE, T_TRUE, T_INT, T_FLOAT, T_STR, T_KNOWN_STR, T_LIST, T_DICT, T_CARDS, T_CARD = range(11)
+
+# Record flags
+R_TIMESTAMP, R_NO_TIMESTAMP = 0, 1
+
+
+class HandCodecError(ValueError):
+    """Raised when a blob cannot be decoded"""
+
+
+# --------------------
+# Primitives
+# --------------------
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        if pos >= len(data):
+            raise HandCodecError("truncated varint")
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _zigzag(n: int) -> int:
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n: int) -> int:
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def _card_byte(value: Any) -> Optional[int]:
+    """Card byte for a dict in the frontend Card shape, else None"""
+    if not isinstance(value, dict) or len(value) != 2:
+        return None
+    rank, suit = value.get("rank"), value.get("suit")
+    if not isinstance(rank, dict) or len(rank) != 2 or list(value) != ["rank", "suit"]:
+        return None
+    if list(rank) != ["value", "symbol"] or isinstance(rank["value"], bool):
+        return None
+    rank_index = _RANK_INDEX.get((rank["value"], rank["symbol"]))
+    suit_index = _SUIT_INDEX.get(suit)
+    if rank_index is None or suit_index is None:
+        return None
+    return rank_index * 4 + suit_index
+
+
+def _card_from_byte(byte: int) -> Dict[str, Any]:
+    if byte >= len(RANKS) * 4:
+        raise HandCodecError(f"invalid card byte {byte}")
+    value, symbol = RANKS[byte // 4]
+    return {"rank": {"value": value, "symbol": symbol}, "suit": SUITS[byte % 4]}
+
+
+def _write_str(out: bytearray, s: str) -> None:
+    raw = s.encode("utf-8")
+    _write_varint(out, len(raw))
+    out += raw
+
+
+def _read_str(data: bytes, pos: int) -> Tuple[str, int]:
+    length, pos = _read_varint(data, pos)
+    end = pos + length
+    if end > len(data):
+        raise HandCodecError("truncated string")
+    return data[pos:end].decode("utf-8"), end
+
+
+# --------------------
+# Values
+# --------------------
+
+def _encode_value(out: bytearray, value: Any) -> None:
+    if value is None:
+        out.append(T_NULL)
+    elif value is True:
+        out.append(T_TRUE)
+    elif value is False:
+        out.append(T_FALSE)
+    elif isinstance(value, int):
+        out.append(T_INT)
+        _write_varint(out, _zigzag(value))
+    elif isinstance(value, float):
+        out.append(T_FLOAT)
+        out += struct.pack("<d", value)
+    elif isinstance(value, str):
+        index = _STRING_INDEX.get(value)
+        if index is not None:
+            out.append(T_KNOWN_STR)
+            out.append(index)
+        else:
+            out.append(T_STR)
+            _write_str(out, value)
+    elif isinstance(value, (list, tuple)):
+        card_bytes = [_card_byte(item) for item in value]
+        if value and None not in card_bytes:
+            out.append(T_CARDS)
+            _write_varint(out, len(card_bytes))
+            out += bytes(card_bytes)
+        else:
+            out.append(T_LIST)
+            _write_varint(out, len(value))
+            for item in value:
+                _encode_value(out, item)
+    elif isinstance(value, dict):
+        card = _card_byte(value)
+        if card is not None:
+            out.append(T_CARD)
+            out.append(card)
+        else:
+            out.append(T_DICT)
+            _encode_dict_body(out, value)
+    else:
+        raise TypeError(f"cannot encode {type(value).__name__}")
+
+
+def _encode_dict_body(out: bytearray, value: Dict[str, Any]) -> None:
+    _write_varint(out, len(value))
+    for key, item in value.items():
+        index = _KEY_INDEX.get(key)
+        if index is not None:
+            _write_varint(out, index * 2)
+        else:
+            raw = str(key).encode("utf-8")
+            _write_varint(out, len(raw) * 2 + 1)
+            out += raw
+        _encode_value(out, item)
+
+
+def _decode_value(data: bytes, pos: int) -> Tuple[Any, int]:
+    if pos >= len(data):
+        raise HandCodecError("truncated value")
+    tag = data[pos]
+    pos += 1
+    if tag == T_NULL:
+        return None, pos
+    if tag == T_TRUE:
+        return True, pos
+    if tag == T_FALSE:
+        return False, pos
+    if tag == T_INT:
+        n, pos = _read_varint(data, pos)
+        return _unzigzag(n), pos
+    if tag == T_FLOAT:
+        if pos + 8 > len(data):
+            raise HandCodecError("truncated float")
+        return struct.unpack_from("<d", data, pos)[0], pos + 8
+    if tag == T_STR:
+        return _read_str(data, pos)
+    if tag == T_KNOWN_STR:
+        if pos >= len(data) or data[pos] >= len(STRINGS):
+            raise HandCodecError("invalid string index")
+        return STRINGS[data[pos]], pos + 1
+    if tag == T_CARDS:
+        count, pos = _read_varint(data, pos)
+        if pos + count > len(data):
+            raise HandCodecError("truncated card list")
+        return [_card_from_byte(b) for b in data[pos:pos + count]], pos + count
+    if tag == T_CARD:
+        if pos >= len(data):
+            raise HandCodecError("truncated card")
+        return _card_from_byte(data[pos]), pos + 1
+    if tag == T_LIST:
+        count, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode_value(data, pos)
+            items.append(item)
+        return items, pos
+    if tag == T_DICT:
+        return _decode_dict_body(data, pos)
+    raise HandCodecError(f"unknown tag {tag}")
+
+
+def _decode_dict_body(data: bytes, pos: int) -> Tuple[Dict[str, Any], int]:
+    count, pos = _read_varint(data, pos)
+    result = {}
+    for _ in range(count):
+        key_code, pos = _read_varint(data, pos)
+        if key_code % 2 == 0:
+            if key_code // 2 >= len(KEYS):
+                raise HandCodecError("invalid key index")
+            key = KEYS[key_code // 2]
+        else:
+            end = pos + key_code // 2
+            if end > len(data):
+                raise HandCodecError("truncated key")
+            key = data[pos:end].decode("utf-8")
+            pos = end
+        result[key], pos = _decode_value(data, pos)
+    return result, pos
+
+
+# --------------------
+# Hands
+# --------------------
+
+def encode_hands(hands: List[Dict[str, Any]]) -> bytes:
+    """Encode a hand history list into a compact blob"""
+    out = bytearray([FORMAT_VERSION])
+    _write_varint(out, len(hands))
+    previous = 0
+    for hand in hands:
+        ts = hand.get("timestamp")
+        if isinstance(ts, int) and not isinstance(ts, bool):
+            out.append(R_TIMESTAMP)
+            _write_varint(out, _zigzag(ts - previous))
+            previous = ts
+            rest = {k: v for k, v in hand.items() if k != "timestamp"}
+        else:
+            out.append(R_NO_TIMESTAMP)
+            rest = hand
+        _encode_dict_body(out, rest)
+    return bytes(out)
+
+
+def decode_hands(blob: bytes) -> List[Dict[str, Any]]:
+    """Decode a blob produced by encode_hands"""
+    if not blob:
+        return []
+    if blob[0] != FORMAT_VERSION:
+        raise HandCodecError(f"unsupported format version {blob[0]}")
+    count, pos = _read_varint(blob, 1)
+    hands = []
+    previous = 0
+    for _ in range(count):
+        if pos >= len(blob):
+            raise HandCodecError("truncated record")
+        flag = blob[pos]
+        pos += 1
+        if flag == R_TIMESTAMP:
+            delta, pos = _read_varint(blob, pos)
+            previous += _unzigzag(delta)
+            body, pos = _decode_dict_body(blob, pos)
+            hands.append({"timestamp": previous, **body})
+        elif flag == R_NO_TIMESTAMP:
+            body, pos = _decode_dict_body(blob, pos)
+            hands.append(body)
+        else:
+            raise HandCodecError(f"invalid record flag {flag}")
+    if pos != len(blob):
+        raise HandCodecError("trailing bytes after last record")
+    return hands
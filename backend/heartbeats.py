@@ -0,0 +1,192 @@
+"""
+Buffered status-check (heartbeat) ingestion.
+
+POST /api/status appends to an in-process buffer instead of inserting a
+document per heartbeat. A background task flushes the buffer as one
+unordered bulk write of upserts into time-bucketed documents, one per
+client per minute:
+
+    {client_name, bucket_start, count, first_ts, last_ts,
+     checks: [{id, timestamp}, ...]}
+
+A failed flush is retried on the next one. When the bulk write fails
+only in part, just the checks behind the failed upserts are requeued.
+
+Reads go through an aggregation that matches on the indexed
+bucket_start first, so GET /api/status is time-ranged and paginated rather than an
+unsorted full scan.
+"""
+import asyncio
+import logging
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_COLLECTION = "status_buckets"
+
+
+def bucket_start(timestamp: datetime) -> datetime:
+    """Floor a timestamp to its minute bucket"""
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def group_checks(checks: Iterable[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Split checks into per-(client, minute) groups, one per bucket upsert"""
+    grouped = defaultdict(list)
+    for check in checks:
+        grouped[(check["client_name"], bucket_start(check["timestamp"]))].append(check)
+    return list(grouped.values())
+
+
+def bucket_update(checks: List[Dict[str, Any]]):
+    """Upsert appending one group of same-client, same-minute checks to its bucket"""
+    from pymongo import UpdateOne
+
+    entries = [{"id": check["id"], "timestamp": check["timestamp"]} for check in checks]
+    timestamps = [entry["timestamp"] for entry in entries]
+    return UpdateOne(
+        {"client_name": checks[0]["client_name"], "bucket_start": bucket_start(timestamps[0])},
+        {
+            "$push": {"checks": {"$each": entries}},
+            "$inc": {"count": len(entries)},
+            "$min": {"first_ts": min(timestamps)},
+            "$max": {"last_ts": max(timestamps)},
+        },
+        upsert=True
+    )
+
+
+def build_bucket_updates(checks: Iterable[Dict[str, Any]]) -> list:
+    """Group checks by (client, minute) into one upsert per bucket"""
+    return [bucket_update(group) for group in group_checks(checks)]
+
+
+def status_query_pipeline(
+    start: datetime,
+    end: datetime,
+    client_name: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """Aggregation returning checks in [start, end), newest first"""
+    match: Dict[str, Any] = {
+        "bucket_start": {"$gte": bucket_start(start), "$lt": end},
+    }
+    if client_name:
+        match["client_name"] = client_name
+
+    return [
+        {"$match": match},
+        {"$unwind": "$checks"},
+        {"$match": {"checks.timestamp": {"$gte": start, "$lt": end}}},
+        {"$sort": {"checks.timestamp": -1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        {"$project": {
+            "_id": 0,
+            "id": "$checks.id",
+            "client_name": 1,
+            "timestamp": "$checks.timestamp",
+        }},
+    ]
+
+
+async def ensure_indexes(db) -> None:
+    """Indexes backing bucket upserts and time-ranged reads"""
+    collection = db[BUCKETS_COLLECTION]
+    await collection.create_index(
+        [("client_name", 1), ("bucket_start", 1)], unique=True
+    )
+    await collection.create_index([("bucket_start", -1)])
+
+
+class HeartbeatBuffer:
+    """In-process heartbeat buffer flushed in batches by a background task"""
+
+    def __init__(
+        self,
+        db,
+        flush_interval: float = 1.0,
+        max_batch: int = 500,
+        max_pending: int = 10000,
+    ):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: Deque[Dict[str, Any]] = deque(maxlen=max_pending)
+        self._flush_now = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.dropped = 0
+
+    def add(self, check: Dict[str, Any]) -> None:
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+        # A full deque discards its oldest entry on append
+        self._pending.append(check)
+        if len(self._pending) >= self.max_batch:
+            self._flush_now.set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    async def flush(self) -> int:
+        """Write everything buffered so far; returns the number of checks written"""
+        from pymongo.errors import BulkWriteError
+
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, deque(maxlen=self.max_pending)
+        groups = group_checks(batch)
+        try:
+            await self.db[BUCKETS_COLLECTION].bulk_write(
+                [bucket_update(group) for group in groups], ordered=False
+            )
+        except BulkWriteError as e:
+            # Unordered: every op not listed in writeErrors was applied, so
+            # only the failed buckets are retried (re-pushing the rest would
+            # store those checks twice)
+            failed = sorted({error["index"] for error in e.details.get("writeErrors", [])})
+            retry = [check for index in failed for check in groups[index]]
+            logger.error(f"Heartbeat flush partially failed ({len(retry)} of {len(batch)} checks): {e}")
+            self._requeue(retry)
+            return len(batch) - len(retry)
+        except Exception as e:
+            logger.error(f"Heartbeat flush failed ({len(batch)} checks): {e}")
+            self._requeue(batch)
+            return 0
+        return len(batch)
+
+    def _requeue(self, checks: Iterable[Dict[str, Any]]) -> None:
+        """Put unwritten checks back in front, still respecting the pending cap"""
+        requeued = deque(checks, maxlen=self.max_pending)
+        total = len(requeued) + len(self._pending)
+        requeued.extend(self._pending)
+        self._pending = requeued
+        self.dropped += max(total - self.max_pending, 0)
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the flusher and write out whatever is still buffered"""
+        self._stopping = True
+        self._flush_now.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        await self.flush()
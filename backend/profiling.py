@@ -0,0 +1,208 @@
+"""
+Opt-in sampling profiler for API requests.
+
+A background thread periodically snapshots the Python stacks of the
+running threads (the event loop plus the executor threads Motor uses for
+Mongo I/O) while at least one request is being profiled, and folds them
+into collapsed-stack counts ("frame;frame;frame N") that flamegraph tools
+read directly. A request is kept when it was picked by the sample rate or
+when it ran longer than the slow threshold; kept profiles live in a
+bounded ring buffer served by the admin routes.
+
+Event-loop samples are attributed to the request whose task was running
+at the time; while another request (or nothing) holds the loop, the
+request gets an "(awaiting)" sample instead. Worker-thread samples
+cannot be tied to a request, so they are added to every profile in
+flight under their thread name.
+
+When both the sample rate and the slow threshold are off the middleware
+is not installed at all, so the hot path pays nothing. Setting the slow
+threshold means every request has to be tracked (slowness is only known
+at the end), so under steady load the sampler thread walks all thread
+stacks every interval without pause.
+"""
+import asyncio
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Leaf frames in these files are idle worker threads, not useful samples
+_IDLE_FILES = ("threading.py", "queue.py", "selectors.py")
+
+AWAITING = "event-loop;(awaiting)"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    """Render a frame chain root-first as a collapsed stack line"""
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        filename = code.co_filename.rsplit("/", 1)[-1]
+        parts.append(f"{code.co_name} ({filename}:{frame.f_lineno})")
+        frame = frame.f_back
+    parts.append(thread_name)
+    parts.reverse()
+    return ";".join(parts)
+
+
+class StackSampler:
+    """Samples thread stacks into the Counters of the requests in flight"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._active: Dict[int, Tuple[Counter, Optional[asyncio.Task]]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+
+    def start(self, key: int) -> None:
+        """Begin collecting for the calling task (must run on the event loop)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        with self._lock:
+            self._active[key] = (Counter(), asyncio.current_task())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="request-profiler", daemon=True
+                )
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, key: int) -> Counter:
+        with self._lock:
+            return self._active.pop(key, (Counter(), None))[0]
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                idle = not self._active
+            if idle:
+                self._wake.clear()
+                self._wake.wait(timeout=1.0)
+                continue
+
+            names = {t.ident: t.name for t in threading.enumerate()}
+            running = asyncio.current_task(self._loop)
+            loop_stack = None
+            worker_stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id == self._loop_thread_id:
+                    loop_stack = _collapse(frame, "event-loop")
+                elif not frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    worker_stacks.append(_collapse(frame, names.get(thread_id, str(thread_id))))
+
+            with self._lock:
+                for counter, task in self._active.values():
+                    counter.update(worker_stacks)
+                    if loop_stack is not None:
+                        counter[loop_stack if task is running else AWAITING] += 1
+
+            time.sleep(self.interval)
+
+
+class ProfileStore:
+    """Fixed-size ring buffer of captured request profiles"""
+
+    def __init__(self, maxlen: int = 50):
+        self._profiles: Deque[Dict[str, Any]] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, profile: Dict[str, Any]) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Profile metadata, newest first, without the stacks"""
+        with self._lock:
+            return [
+                {k: v for k, v in p.items() if k != "stacks"}
+                for p in reversed(self._profiles)
+            ]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for profile in self._profiles:
+                if profile["id"] == profile_id:
+                    return profile
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._profiles.clear()
+
+
+def collapsed_text(profile: Dict[str, Any]) -> str:
+    """Collapsed-stack file contents for one profile"""
+    lines = [f"{stack} {count}" for stack, count in profile["stacks"].most_common()]
+    return "\n".join(lines) + "\n"
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles sampled and slow HTTP requests"""
+
+    def __init__(
+        self,
+        app,
+        store: ProfileStore,
+        sample_rate: float = 0.0,
+        slow_ms: float = 0.0,
+        interval_ms: float = 5.0,
+        exclude_prefix: str = "/api/admin",
+    ):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.exclude_prefix = exclude_prefix
+        self.sampler = StackSampler(interval=interval_ms / 1000)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        key = id(scope)
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.sampler.start(key)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            stacks = self.sampler.stop(key)
+            duration_ms = (time.perf_counter() - start) * 1000
+            slow = self.slow_ms > 0 and duration_ms >= self.slow_ms
+            if (sampled or slow) and stacks:
+                self.store.add({
+                    "id": uuid.uuid4().hex[:12],
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": status_code,
+                    "duration_ms": round(duration_ms, 2),
+                    "reason": "slow" if slow else "sampled",
+                    "samples": sum(stacks.values()),
+                    "started_at": started_at.isoformat(),
+                    "stacks": stacks,
+                })
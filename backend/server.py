@@ -1,35 +1,26 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Response, Request
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, HTTPException, Response, Request, Query
+from fastapi.responses import JSONResponse, PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
-import os
+import asyncio
 import logging
-import httpx
-from pathlib import Path
+from contextlib import asynccontextmanager
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import uuid
+import hmac
 from datetime import datetime, timezone, timedelta
-
-ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
-
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
-
-# Create the main app without a prefix
-app = FastAPI()
+from bankroll import SimulationCache, SimulationParams, input_hash, simulate
+from config import Settings
+from grading import GradeRequest, grade, regrade_histories
+from hand_codec import HandCodecError, decode_hands, encode_hands
+from heartbeats import BUCKETS_COLLECTION, HeartbeatBuffer, ensure_indexes, status_query_pipeline
+from profiling import ProfileStore, ProfilingMiddleware, collapsed_text
+from sync_payloads import MAX_SETTINGS_BODY_BYTES, SettingsUpdate, SyncData, read_json_body
+from user_cache import UserDocCache
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 # ====================
@@ -69,17 +60,32 @@ class UserHistory(BaseModel):
     hands: List[Dict[str, Any]] = Field(default_factory=list)
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
-class SyncData(BaseModel):
-    game_stats: Optional[Dict[str, Any]] = None
-    strategy_stats: Optional[Dict[str, Any]] = None
-    training_stats: Optional[Dict[str, Any]] = None
-    hands: Optional[List[Dict[str, Any]]] = None
-    settings: Optional[Dict[str, Any]] = None
-
 # ====================
 # Auth Helper
 # ====================
 
+def get_db(request: Request):
+    """Database handle opened by the app lifespan"""
+    return request.app.state.db
+
+def get_user_cache(request: Request) -> UserDocCache:
+    return request.app.state.user_cache
+
+async def read_sync_data(request: Request) -> SyncData:
+    """Sync upload, size-capped and validated against the typed SyncData"""
+    return await read_json_body(request, SyncData, request.app.state.settings.sync_max_body_bytes)
+
+async def find_user_doc(
+    request: Request, collection: str, user_id: str, fresh: bool = False
+) -> Optional[Dict[str, Any]]:
+    """A user's users/stats/history document, from the cache unless `fresh`"""
+    cache = get_user_cache(request)
+    doc = None if fresh else cache.get(collection, user_id)
+    if doc is None:
+        doc = await get_db(request)[collection].find_one({"user_id": user_id}, {"_id": 0})
+        cache.put(collection, user_id, doc)
+    return doc
+
 async def get_current_user(request: Request) -> Optional[User]:
     """Get current user from session token (cookie or header)"""
     # Try cookie first
@@ -94,6 +100,8 @@ async def get_current_user(request: Request) -> Optional[User]:
     if not session_token:
         return None
     
+    db = get_db(request)
+    
     # Find session
     session_doc = await db.user_sessions.find_one(
         {"session_token": session_token},
@@ -121,10 +129,7 @@ async def get_current_user(request: Request) -> Optional[User]:
         return None
     
     # Get user
-    user_doc = await db.users.find_one(
-        {"user_id": session_doc["user_id"]},
-        {"_id": 0}
-    )
+    user_doc = await find_user_doc(request, "users", session_doc["user_id"])
     
     if not user_doc:
         return None
@@ -144,6 +149,13 @@ async def require_auth(request: Request) -> User:
         raise HTTPException(status_code=401, detail="Not authenticated")
     return user
 
+def require_admin(request: Request) -> None:
+    """Require the X-Admin-Token header to match ADMIN_TOKEN"""
+    admin_token = request.app.state.settings.admin_token
+    provided = request.headers.get("X-Admin-Token", "")
+    if not admin_token or not hmac.compare_digest(provided, admin_token):
+        raise HTTPException(status_code=403, detail="Admin access required")
+
 # ====================
 # Status Routes
 # ====================
@@ -153,26 +165,91 @@ async def root():
     return {"message": "Blackjack Trainer API"}
 
 @api_router.post("/status", response_model=StatusCheck)
-async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.model_dump()
-    status_obj = StatusCheck(**status_dict)
-    doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    _ = await db.status_checks.insert_one(doc)
+async def create_status_check(request: Request, input: StatusCheckCreate):
+    """Record a heartbeat (buffered, written in batches)"""
+    status_obj = StatusCheck(**input.model_dump())
+    request.app.state.heartbeats.add(status_obj.model_dump())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    return status_checks
+async def get_status_checks(
+    request: Request,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    client_name: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """Heartbeats in [start, end), newest first (defaults to the last hour)"""
+    db = get_db(request)
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(hours=1)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    
+    pipeline = status_query_pipeline(start, end, client_name, skip, limit)
+    return await db[BUCKETS_COLLECTION].aggregate(pipeline).to_list(limit)
 
 # ====================
 # Auth Routes
 # ====================
 
+async def upsert_user(db, email: str, name: str, picture: Optional[str]) -> Dict[str, Any]:
+    """Update a returning user or create a new one, returning the stored document"""
+    from pymongo import ReturnDocument
+    from pymongo.errors import DuplicateKeyError
+    
+    now = datetime.now(timezone.utc).isoformat()
+    update = {
+        "$set": {"name": name, "picture": picture, "last_sync": now},
+        "$setOnInsert": {
+            "user_id": f"user_{uuid.uuid4().hex[:12]}",
+            "email": email,
+            "created_at": now,
+            "settings": {}
+        }
+    }
+    for attempt in range(2):
+        try:
+            return await db.users.find_one_and_update(
+                {"email": email},
+                update,
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # A concurrent login inserted the same email first; retry as an update
+            if attempt:
+                raise
+
+async def replace_sessions(db, user_id: str, session_token: str) -> None:
+    """Store the new session and revoke every session the user opened before it"""
+    now = datetime.now(timezone.utc)
+    created_at = now.isoformat()
+    # Only older sessions are revoked, so two concurrent logins can't delete
+    # each other's new session: the newest one always survives. That also
+    # makes the two writes order-independent, so they share one round trip
+    await asyncio.gather(
+        db.user_sessions.replace_one(
+            {"user_id": user_id, "session_token": session_token},
+            {
+                "user_id": user_id,
+                "session_token": session_token,
+                "expires_at": (now + timedelta(days=7)).isoformat(),
+                "created_at": created_at
+            },
+            upsert=True
+        ),
+        db.user_sessions.delete_many({
+            "user_id": user_id,
+            "session_token": {"$ne": session_token},
+            "created_at": {"$lt": created_at}
+        })
+    )
+
 @api_router.post("/auth/session")
 async def create_session(request: Request, response: Response):
     """Exchange session_id for session_token"""
@@ -182,22 +259,24 @@ async def create_session(request: Request, response: Response):
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id required")
     
+    import httpx
+    
     # Exchange session_id with Emergent auth
-    async with httpx.AsyncClient() as client:
-        try:
-            auth_response = await client.get(
-                "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
-                headers={"X-Session-ID": session_id}
-            )
-            
-            if auth_response.status_code != 200:
-                logger.error(f"Auth failed: {auth_response.status_code} - {auth_response.text}")
-                raise HTTPException(status_code=401, detail="Invalid session_id")
-            
-            auth_data = auth_response.json()
-        except httpx.RequestError as e:
-            logger.error(f"Auth request error: {e}")
-            raise HTTPException(status_code=500, detail="Auth service unavailable")
+    http_client = request.app.state.http_client
+    try:
+        auth_response = await http_client.get(
+            request.app.state.settings.auth_service_url,
+            headers={"X-Session-ID": session_id}
+        )
+        
+        if auth_response.status_code != 200:
+            logger.error(f"Auth failed: {auth_response.status_code} - {auth_response.text}")
+            raise HTTPException(status_code=401, detail="Invalid session_id")
+        
+        auth_data = auth_response.json()
+    except httpx.RequestError as e:
+        logger.error(f"Auth request error: {e}")
+        raise HTTPException(status_code=500, detail="Auth service unavailable")
     
     email = auth_data.get("email")
     name = auth_data.get("name", email.split("@")[0] if email else "User")
@@ -207,56 +286,14 @@ async def create_session(request: Request, response: Response):
     if not email or not session_token:
         raise HTTPException(status_code=400, detail="Invalid auth response")
     
-    # Find or create user
-    existing_user = await db.users.find_one({"email": email}, {"_id": 0})
+    db = get_db(request)
     
-    if existing_user:
-        user_id = existing_user["user_id"]
-        # Update user info if needed
-        await db.users.update_one(
-            {"email": email},
-            {"$set": {
-                "name": name,
-                "picture": picture,
-                "last_sync": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-    else:
-        user_id = f"user_{uuid.uuid4().hex[:12]}"
-        user_doc = {
-            "user_id": user_id,
-            "email": email,
-            "name": name,
-            "picture": picture,
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "last_sync": datetime.now(timezone.utc).isoformat(),
-            "settings": {}
-        }
-        await db.users.insert_one(user_doc)
-        
-        # Initialize stats and history for new user
-        await db.stats.insert_one({
-            "user_id": user_id,
-            "game_stats": {},
-            "strategy_stats": {},
-            "training_stats": {},
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        })
-        await db.history.insert_one({
-            "user_id": user_id,
-            "hands": [],
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        })
+    # Find or create user in one round trip; stats and history are created on first sync
+    user_doc = await upsert_user(db, email, name, picture)
+    user_id = user_doc["user_id"]
+    get_user_cache(request).put("users", user_id, user_doc)
     
-    # Store session
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
-    await db.user_sessions.delete_many({"user_id": user_id})
-    await db.user_sessions.insert_one({
-        "user_id": user_id,
-        "session_token": session_token,
-        "expires_at": expires_at.isoformat(),
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
+    await replace_sessions(db, user_id, session_token)
     
     # Set cookie
     response.set_cookie(
@@ -269,8 +306,6 @@ async def create_session(request: Request, response: Response):
         max_age=7 * 24 * 60 * 60
     )
     
-    # Fetch user for response
-    user_doc = await db.users.find_one({"user_id": user_id}, {"_id": 0})
     if isinstance(user_doc.get("created_at"), str):
         user_doc["created_at"] = datetime.fromisoformat(user_doc["created_at"])
     if isinstance(user_doc.get("last_sync"), str):
@@ -297,6 +332,7 @@ async def logout(request: Request, response: Response):
             session_token = auth_header.split(" ")[1]
     
     if session_token:
+        db = get_db(request)
         await db.user_sessions.delete_many({"session_token": session_token})
     
     response.delete_cookie(
@@ -317,10 +353,7 @@ async def get_user_stats(request: Request):
     """Get user's synced stats"""
     user = await require_auth(request)
     
-    stats_doc = await db.stats.find_one(
-        {"user_id": user.user_id},
-        {"_id": 0}
-    )
+    stats_doc = await find_user_doc(request, "stats", user.user_id)
     
     if not stats_doc:
         return {
@@ -331,7 +364,7 @@ async def get_user_stats(request: Request):
             "updated_at": None
         }
     
-    return stats_doc
+    return stats_response(stats_doc)
 
 def merge_stats(existing_stats: Dict[str, Any], new_stats: Dict[str, Any]) -> Dict[str, Any]:
     if not new_stats:
@@ -349,119 +382,216 @@ def merge_stats(existing_stats: Dict[str, Any], new_stats: Dict[str, Any]) -> Di
             merged[key] = value
     return merged
 
-@api_router.post("/sync/stats")
-async def update_user_stats(request: Request, data: SyncData):
-    """Update user's synced stats (merge strategy)"""
-    user = await require_auth(request)
+def _count(value: Any) -> int:
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+def stats_response(stats_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Stats document as served, with regrade adjustments applied.
     
-    # Get existing stats
-    existing = await db.stats.find_one(
-        {"user_id": user.user_id},
-        {"_id": 0}
-    )
+    Counts are clamped at zero and a mistake entry that drops to zero is
+    removed, so a decrement for a mistake the client never recorded is a no-op.
+    """
+    adjustments = stats_doc.get("regrade_adjustments")
+    view = {k: v for k, v in stats_doc.items() if k != "regrade_adjustments"}
+    if not adjustments:
+        return view
     
-    if not existing:
-        existing = {
-            "user_id": user.user_id,
-            "game_stats": {},
-            "strategy_stats": {},
-            "training_stats": {}
-        }
+    strategy = dict(view.get("strategy_stats") or {})
+    if adjustments.get("correctDecisions"):
+        strategy["correctDecisions"] = max(_count(strategy.get("correctDecisions")) + adjustments["correctDecisions"], 0)
+    if adjustments.get("mistakes"):
+        mistakes = strategy.get("mistakes")
+        mistakes = dict(mistakes) if isinstance(mistakes, dict) else {}
+        for key, adjustment in adjustments["mistakes"].items():
+            entry = mistakes.get(key)
+            entry = entry if isinstance(entry, dict) else {}
+            count = _count(entry.get("count")) + _count(adjustment.get("count"))
+            if count > 0:
+                mistakes[key] = {
+                    "correct": adjustment.get("correct"),
+                    "wrong": adjustment.get("wrong"),
+                    **entry,
+                    "count": count
+                }
+            else:
+                mistakes.pop(key, None)
+        strategy["mistakes"] = mistakes
+    view["strategy_stats"] = strategy
+    return view
+
+USER_DOC_WRITE_ATTEMPTS = 3
+
+async def update_user_doc(
+    request: Request,
+    collection: str,
+    user_id: str,
+    build: Callable[[Optional[Dict[str, Any]]], Dict[str, Any]],
+    unset: Tuple[str, ...] = ()
+) -> Dict[str, Any]:
+    """
+    Read-modify-write a user's stats/history document, returning it as written.
     
-    updated_stats = {
-        "user_id": user.user_id,
-        "game_stats": merge_stats(existing.get("game_stats", {}), data.game_stats or {}),
-        "strategy_stats": merge_stats(existing.get("strategy_stats", {}), data.strategy_stats or {}),
-        "training_stats": merge_stats(existing.get("training_stats", {}), data.training_stats or {}),
-        "updated_at": datetime.now(timezone.utc).isoformat()
+    The base may be a cached copy, so the write only applies while the stored
+    updated_at still matches it; otherwise the base is re-read from Mongo and
+    `build` runs again.
+    """
+    from pymongo.errors import DuplicateKeyError
+    
+    db = get_db(request)
+    for attempt in range(USER_DOC_WRITE_ATTEMPTS):
+        base = await find_user_doc(request, collection, user_id, fresh=attempt > 0)
+        fields = {**build(base), "updated_at": datetime.now(timezone.utc).isoformat()}
+        update = {"$set": fields}
+        if unset:
+            update["$unset"] = {name: "" for name in unset}
+        if base is None:
+            query = {"user_id": user_id, "updated_at": {"$exists": False}}
+        else:
+            query = {"user_id": user_id, "updated_at": base.get("updated_at")}
+        try:
+            result = await db[collection].update_one(query, update, upsert=base is None)
+        except DuplicateKeyError:
+            # Created by a concurrent request since our read
+            continue
+        if base is None or result.matched_count:
+            doc = {k: v for k, v in (base or {}).items() if k not in unset}
+            doc.update(fields, user_id=user_id)
+            get_user_cache(request).put(collection, user_id, doc)
+            return doc
+    raise HTTPException(status_code=409, detail="Concurrent update, please retry")
+
+def merged_stats_fields(base: Optional[Dict[str, Any]], data: SyncData) -> Dict[str, Any]:
+    base = base or {}
+    return {
+        "game_stats": merge_stats(base.get("game_stats", {}), data.game_stats or {}),
+        "strategy_stats": merge_stats(base.get("strategy_stats", {}), data.strategy_stats or {}),
+        "training_stats": merge_stats(base.get("training_stats", {}), data.training_stats or {})
     }
+
+@api_router.post("/sync/stats")
+async def update_user_stats(request: Request):
+    """Update user's synced stats (merge strategy)"""
+    user = await require_auth(request)
+    data = await read_sync_data(request)
+    db = get_db(request)
     
-    await db.stats.update_one(
-        {"user_id": user.user_id},
-        {"$set": updated_stats},
-        upsert=True
+    updated_stats = await update_user_doc(
+        request, "stats", user.user_id, lambda base: merged_stats_fields(base, data)
     )
     
     # Update user last_sync
+    last_sync = datetime.now(timezone.utc).isoformat()
     await db.users.update_one(
         {"user_id": user.user_id},
-        {"$set": {"last_sync": datetime.now(timezone.utc).isoformat()}}
+        {"$set": {"last_sync": last_sync}}
     )
+    get_user_cache(request).patch("users", user.user_id, {"last_sync": last_sync})
+    
+    return stats_response(updated_stats)
+
+MAX_HISTORY_HANDS = 200
+
+def load_hands(history_doc: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Hands from a history document (binary blob, or legacy JSON list)"""
+    if not history_doc:
+        return []
+    if history_doc.get("hands_blob") is not None:
+        try:
+            return decode_hands(bytes(history_doc["hands_blob"]))
+        except HandCodecError as e:
+            # A corrupt blob must not fail every sync for this user; the
+            # next write replaces it
+            logger.error(f"Unreadable hand history for {history_doc.get('user_id')}: {e}")
+    return history_doc.get("hands", [])
+
+def history_response(user_id: str, history_doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """JSON view of a history document with hands decoded"""
+    return {
+        "user_id": user_id,
+        "hands": load_hands(history_doc),
+        "updated_at": history_doc.get("updated_at") if history_doc else None
+    }
+
+def _regraded_at(hand: Dict[str, Any]) -> str:
+    stamp = hand.get("regradedAt")
+    return stamp if isinstance(stamp, str) else ""
+
+def merge_hand_history(new_hands: List[Dict[str, Any]], existing_hands: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Merge hands (newer first, dedupe by timestamp, cap at MAX_HISTORY_HANDS).
+    
+    For a timestamp present on both sides the uploaded copy wins, unless the
+    stored one was re-graded more recently (clients re-send their own,
+    pre-regrade copy of every hand).
+    """
+    merged: Dict[Any, Dict[str, Any]] = {}
+    for hand in new_hands + existing_hands:
+        ts = hand.get("timestamp")
+        if not ts:
+            continue
+        kept = merged.get(ts)
+        if kept is None or _regraded_at(hand) > _regraded_at(kept):
+            merged[ts] = hand
+    
+    unique_hands = sorted(merged.values(), key=lambda h: h.get("timestamp", 0), reverse=True)
+    return unique_hands[:MAX_HISTORY_HANDS]
+
+async def save_hand_history(
+    request: Request, user_id: str, new_hands: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], str]:
+    """Merge uploaded hands into the stored history (compact binary form); returns the hands and updated_at"""
+    merged: List[Dict[str, Any]] = []
+    
+    def build(base):
+        merged[:] = merge_hand_history(new_hands, load_hands(base))
+        return {"hands_blob": encode_hands(merged), "hand_count": len(merged)}
     
-    return updated_stats
+    history_doc = await update_user_doc(request, "history", user_id, build, unset=("hands",))
+    return merged, history_doc["updated_at"]
 
 @api_router.get("/sync/history")
-async def get_user_history(request: Request):
-    """Get user's hand history"""
+async def get_user_history(
+    request: Request,
+    fmt: str = Query("json", alias="format", pattern="^(json|binary)$")
+):
+    """Get user's hand history (format=binary returns the stored blob as-is)"""
     user = await require_auth(request)
     
-    history_doc = await db.history.find_one(
-        {"user_id": user.user_id},
-        {"_id": 0}
-    )
+    history_doc = await find_user_doc(request, "history", user.user_id)
     
-    if not history_doc:
-        return {
-            "user_id": user.user_id,
-            "hands": [],
-            "updated_at": None
-        }
+    if fmt == "binary":
+        if history_doc and history_doc.get("hands_blob") is not None:
+            blob = bytes(history_doc["hands_blob"])
+        else:
+            blob = encode_hands(load_hands(history_doc))
+        return Response(content=blob, media_type="application/octet-stream")
     
-    return history_doc
+    return history_response(user.user_id, history_doc)
 
 @api_router.post("/sync/history")
-async def update_user_history(request: Request, data: SyncData):
+async def update_user_history(request: Request):
     """Update user's hand history (merge and cap at 200)"""
     user = await require_auth(request)
+    data = await read_sync_data(request)
     
     if not data.hands:
         raise HTTPException(status_code=400, detail="hands required")
     
-    # Get existing history
-    existing = await db.history.find_one(
-        {"user_id": user.user_id},
-        {"_id": 0}
-    )
-    
-    existing_hands = existing.get("hands", []) if existing else []
-    
-    # Merge hands (newer first, dedupe by timestamp)
-    all_hands = data.hands + existing_hands
-    seen_timestamps = set()
-    unique_hands = []
-    for hand in all_hands:
-        ts = hand.get("timestamp")
-        if ts and ts not in seen_timestamps:
-            seen_timestamps.add(ts)
-            unique_hands.append(hand)
-    
-    # Sort by timestamp descending and cap at 200
-    unique_hands.sort(key=lambda h: h.get("timestamp", 0), reverse=True)
-    capped_hands = unique_hands[:200]
+    capped_hands, updated_at = await save_hand_history(request, user.user_id, data.hands)
     
-    updated_history = {
+    return {
         "user_id": user.user_id,
         "hands": capped_hands,
-        "updated_at": datetime.now(timezone.utc).isoformat()
+        "updated_at": updated_at
     }
-    
-    await db.history.update_one(
-        {"user_id": user.user_id},
-        {"$set": updated_history},
-        upsert=True
-    )
-    
-    return updated_history
 
 @api_router.get("/sync/settings")
 async def get_user_settings(request: Request):
     """Get user's settings"""
     user = await require_auth(request)
     
-    user_doc = await db.users.find_one(
-        {"user_id": user.user_id},
-        {"_id": 0, "settings": 1}
-    )
+    user_doc = await find_user_doc(request, "users", user.user_id)
     
     return {"settings": user_doc.get("settings", {}) if user_doc else {}}
 
@@ -469,105 +599,476 @@ async def get_user_settings(request: Request):
 async def update_user_settings(request: Request):
     """Update user's settings"""
     user = await require_auth(request)
-    body = await request.json()
-    settings = body.get("settings", {})
+    db = get_db(request)
+    body = await read_json_body(request, SettingsUpdate, MAX_SETTINGS_BODY_BYTES)
+    settings = body.settings or {}
     
-    await db.users.update_one(
-        {"user_id": user.user_id},
-        {"$set": {
-            "settings": settings,
-            "last_sync": datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    fields = {
+        "settings": settings,
+        "last_sync": datetime.now(timezone.utc).isoformat()
+    }
+    await db.users.update_one({"user_id": user.user_id}, {"$set": fields})
+    get_user_cache(request).patch("users", user.user_id, fields)
     
     return {"settings": settings}
 
 @api_router.post("/sync/full")
-async def full_sync(request: Request, data: SyncData):
+async def full_sync(request: Request):
     """Full sync - upload and download all data"""
     user = await require_auth(request)
+    data = await read_sync_data(request)
+    db = get_db(request)
+    cache = get_user_cache(request)
     
     # Update stats if provided
     if data.game_stats or data.strategy_stats or data.training_stats:
-        existing_stats = await db.stats.find_one(
-            {"user_id": user.user_id},
-            {"_id": 0}
-        ) or {"game_stats": {}, "strategy_stats": {}, "training_stats": {}}
-        
-        await db.stats.update_one(
-            {"user_id": user.user_id},
-            {"$set": {
-                "game_stats": merge_stats(existing_stats.get("game_stats", {}), data.game_stats or {}),
-                "strategy_stats": merge_stats(existing_stats.get("strategy_stats", {}), data.strategy_stats or {}),
-                "training_stats": merge_stats(existing_stats.get("training_stats", {}), data.training_stats or {}),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }},
-            upsert=True
-        )
+        await update_user_doc(request, "stats", user.user_id, lambda base: merged_stats_fields(base, data))
     
     # Update history if provided
     if data.hands:
-        existing_history = await db.history.find_one(
-            {"user_id": user.user_id},
-            {"_id": 0}
-        )
-        existing_hands = existing_history.get("hands", []) if existing_history else []
-        
-        all_hands = data.hands + existing_hands
-        seen = set()
-        unique = []
-        for h in all_hands:
-            ts = h.get("timestamp")
-            if ts and ts not in seen:
-                seen.add(ts)
-                unique.append(h)
-        unique.sort(key=lambda x: x.get("timestamp", 0), reverse=True)
+        await save_hand_history(request, user.user_id, data.hands)
+    
+    # Update settings (if provided) and last_sync
+    user_fields = {"last_sync": datetime.now(timezone.utc).isoformat()}
+    if data.settings:
+        user_fields["settings"] = data.settings
+    await db.users.update_one({"user_id": user.user_id}, {"$set": user_fields})
+    cache.patch("users", user.user_id, user_fields)
+    
+    # Fetch and return all data (served from the cache after the writes above)
+    stats, history, user_doc = await asyncio.gather(
+        find_user_doc(request, "stats", user.user_id),
+        find_user_doc(request, "history", user.user_id),
+        find_user_doc(request, "users", user.user_id)
+    )
+    
+    return {
+        "stats": stats_response(stats) if stats else {},
+        "history": history_response(user.user_id, history) if history else {},
+        "settings": user_doc.get("settings", {}) if user_doc else {},
+        "last_sync": user_doc.get("last_sync") if user_doc else None
+    }
+
+# ====================
+# Simulation Routes
+# ====================
+
+def get_process_pool(app: FastAPI):
+    """Process pool for CPU-bound work, started on first use"""
+    if app.state.process_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
         
-        await db.history.update_one(
-            {"user_id": user.user_id},
+        workers = app.state.settings.sim_workers or None
+        app.state.process_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return app.state.process_pool
+
+@api_router.post("/simulations/bankroll")
+async def simulate_bankroll(request: Request, params: SimulationParams):
+    """Risk of ruin, win rate, SD and N0 for a Hi-Lo bet ramp (memoized by input hash)"""
+    await require_auth(request)
+    db = get_db(request)
+    state = request.app.state
+    key = input_hash(params)
+    
+    cached = state.sim_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+    
+    stored = await db.simulations.find_one({"input_hash": key}, {"_id": 0, "result": 1})
+    if stored:
+        state.sim_cache.put(key, stored["result"])
+        return {**stored["result"], "cached": True}
+    
+    # Identical concurrent requests share one run
+    task = state.sim_inflight.get(key)
+    if task is None:
+        pool = get_process_pool(request.app)
+        task = asyncio.ensure_future(asyncio.to_thread(simulate, params, pool))
+        state.sim_inflight[key] = task
+        task.add_done_callback(lambda _: state.sim_inflight.pop(key, None))
+    result = await asyncio.shield(task)
+    
+    if state.sim_cache.get(key) is None:
+        state.sim_cache.put(key, result)
+        await db.simulations.update_one(
+            {"input_hash": key},
             {"$set": {
-                "hands": unique[:200],
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "input_hash": key,
+                "params": params.model_dump(),
+                "result": result,
+                "created_at": datetime.now(timezone.utc).isoformat()
             }},
             upsert=True
         )
     
-    # Update settings if provided
-    if data.settings:
-        await db.users.update_one(
-            {"user_id": user.user_id},
-            {"$set": {"settings": data.settings}}
-        )
-    
-    # Update last_sync
-    await db.users.update_one(
-        {"user_id": user.user_id},
-        {"$set": {"last_sync": datetime.now(timezone.utc).isoformat()}}
+    return {**result, "cached": False}
+
+# ====================
+# Grading Routes
+# ====================
+
+@api_router.post("/grading/decisions")
+async def grade_decisions(request: Request, data: GradeRequest):
+    """Grade a batch of decisions against basic strategy and deviations"""
+    await require_auth(request)
+    items = [item.model_dump() for item in data.decisions]
+    results = await asyncio.to_thread(grade, items)
+    return {
+        **results,
+        "total": len(items),
+        "correct": sum(results["is_correct"])
+    }
+
+REGRADE_CHUNK_SIZE = 50
+
+async def apply_regrade(db, cache: UserDocCache, result: Dict[str, Any]) -> bool:
+    """Write one user's re-graded history; skipped if the history changed meanwhile"""
+    # Bumping updated_at makes writers holding an older (cached) copy re-read
+    now = datetime.now(timezone.utc).isoformat()
+    written = await db.history.update_one(
+        {"user_id": result["user_id"], "updated_at": result["updated_at"]},
+        {
+            "$set": {
+                "hands_blob": result["hands_blob"],
+                "hand_count": result["hand_count"],
+                "updated_at": now,
+                "regraded_at": result["regraded_at"]
+            },
+            "$unset": {"hands": ""}
+        }
     )
+    cache.invalidate("history", result["user_id"])
+    if not written.modified_count:
+        return False
+    
+    # Kept apart from strategy_stats, which clients overwrite with max()
+    # merges, and folded in when stats are served (stats_response)
+    inc = {}
+    set_fields = {"updated_at": now}
+    if result["correct_delta"]:
+        inc["regrade_adjustments.correctDecisions"] = result["correct_delta"]
+    for key, mistake in result["mistakes"].items():
+        inc[f"regrade_adjustments.mistakes.{key}.count"] = mistake["count"]
+        if mistake["count"] > 0:
+            set_fields[f"regrade_adjustments.mistakes.{key}.correct"] = mistake["correct"]
+            set_fields[f"regrade_adjustments.mistakes.{key}.wrong"] = mistake["wrong"]
+    if inc:
+        await db.stats.update_one({"user_id": result["user_id"]}, {"$inc": inc, "$set": set_fields})
+        cache.invalidate("stats", result["user_id"])
+    return True
+
+async def run_regrade_job(app: FastAPI, job: Dict[str, Any]) -> None:
+    """Re-score every stored history, grading chunks in parallel on the process pool"""
+    db = app.state.db
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool(app)
+    in_flight = set()
     
-    # Fetch and return all data
-    stats = await db.stats.find_one({"user_id": user.user_id}, {"_id": 0})
-    history = await db.history.find_one({"user_id": user.user_id}, {"_id": 0})
-    user_doc = await db.users.find_one({"user_id": user.user_id}, {"_id": 0})
+    async def process(chunk):
+        results = await loop.run_in_executor(pool, regrade_histories, chunk)
+        for result in results:
+            if "error" in result:
+                logger.warning(f"Regrade job {job['id']}: user {result['user_id']} failed: {result['error']}")
+                job["users_failed"] += 1
+                continue
+            try:
+                applied = await apply_regrade(db, app.state.user_cache, result)
+            except Exception as e:
+                logger.warning(f"Regrade job {job['id']}: user {result['user_id']} not written: {e}")
+                job["users_failed"] += 1
+                continue
+            if applied:
+                job["users_updated"] += 1
+                job["decisions_changed"] += result["decisions_changed"]
+            else:
+                job["users_skipped"] += 1
+        job["users_scanned"] += len(chunk)
     
+    try:
+        chunk = []
+        async for doc in db.history.find({}, {"_id": 0}):
+            chunk.append(doc)
+            if len(chunk) >= REGRADE_CHUNK_SIZE:
+                in_flight.add(asyncio.ensure_future(process(chunk)))
+                chunk = []
+                if len(in_flight) >= job["parallel"]:
+                    done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        task.result()
+        if chunk:
+            in_flight.add(asyncio.ensure_future(process(chunk)))
+        for task in asyncio.as_completed(in_flight):
+            await task
+        job["status"] = "completed"
+    except Exception as e:
+        for task in in_flight:
+            task.cancel()
+        logger.error(f"Regrade job {job['id']} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        job["finished_at"] = datetime.now(timezone.utc).isoformat()
+
+# ====================
+# Admin Routes
+# ====================
+
+@api_router.get("/admin/profiles")
+async def list_profiles(request: Request):
+    """List captured request profiles (newest first)"""
+    require_admin(request)
+    settings = request.app.state.settings
     return {
-        "stats": stats or {},
-        "history": history or {},
-        "settings": user_doc.get("settings", {}) if user_doc else {},
-        "last_sync": user_doc.get("last_sync") if user_doc else None
+        "sample_rate": settings.profile_sample_rate,
+        "slow_ms": settings.profile_slow_ms,
+        "profiles": request.app.state.profile_store.list()
+    }
+
+@api_router.get("/admin/profiles/{profile_id}")
+async def download_profile(request: Request, profile_id: str):
+    """Download one profile as collapsed stacks (flamegraph input)"""
+    require_admin(request)
+    profile = request.app.state.profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        collapsed_text(profile),
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.collapsed"'}
+    )
+
+@api_router.delete("/admin/profiles")
+async def clear_profiles(request: Request):
+    """Drop all captured profiles"""
+    require_admin(request)
+    request.app.state.profile_store.clear()
+    return {"message": "Profiles cleared"}
+
+@api_router.get("/admin/cache")
+async def user_cache_stats(request: Request):
+    """Per-user document cache occupancy and hit rate"""
+    require_admin(request)
+    return get_user_cache(request).stats()
+
+@api_router.post("/admin/regrade")
+async def start_regrade(request: Request, parallel: int = Query(4, ge=1, le=32)):
+    """Start a background job re-scoring all stored hand histories"""
+    require_admin(request)
+    jobs = request.app.state.regrade_jobs
+    if any(job["status"] == "running" for job in jobs.values()):
+        raise HTTPException(status_code=409, detail="Regrade already running")
+    
+    job = {
+        "id": uuid.uuid4().hex[:12],
+        "status": "running",
+        "parallel": parallel,
+        "users_scanned": 0,
+        "users_updated": 0,
+        "users_skipped": 0,
+        "users_failed": 0,
+        "decisions_changed": 0,
+        "error": None,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "finished_at": None
     }
+    jobs[job["id"]] = job
+    job_task = asyncio.create_task(run_regrade_job(request.app, job))
+    request.app.state.background_tasks.add(job_task)
+    job_task.add_done_callback(request.app.state.background_tasks.discard)
+    return job
+
+@api_router.get("/admin/regrade/{job_id}")
+async def regrade_status(request: Request, job_id: str):
+    """Progress of a regrade job"""
+    require_admin(request)
+    job = request.app.state.regrade_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+# ====================
+# Health Routes
+# ====================
+
+@api_router.get("/ready")
+async def readiness(request: Request):
+    """Readiness probe - 200 only when Mongo answers, unique indexes exist and the HTTP client is open"""
+    state = request.app.state
+    checks = {}
+    
+    try:
+        await asyncio.wait_for(
+            state.mongo_client.admin.command("ping"),
+            timeout=state.settings.ready_timeout
+        )
+        checks["mongo"] = "ok"
+    except Exception as e:
+        checks["mongo"] = f"error: {type(e).__name__}"
+    
+    # Indexes are created at warm-up; retry here until that has succeeded
+    if not state.indexes_ready and checks["mongo"] == "ok":
+        try:
+            state.indexes_ready = await asyncio.wait_for(
+                ensure_app_indexes(state.db),
+                timeout=state.settings.ready_timeout
+            )
+        except Exception as e:
+            logger.warning(f"Index creation retry failed: {e}")
+    checks["indexes"] = "ok" if state.indexes_ready else "missing"
+    
+    checks["http_client"] = "closed" if state.http_client.is_closed else "ok"
+    
+    ready = all(value == "ok" for value in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks}
+    )
 
-# Include the router in the main app
-app.include_router(api_router)
+# ====================
+# App Factory
+# ====================
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# (collection, keys, unique)
+INDEXES = [
+    ("simulations", "input_hash", True),
+    ("users", "email", True),
+    ("users", "user_id", True),
+    ("user_sessions", "session_token", False),
+    ("user_sessions", "user_id", False),
+    # One stats/history document per user; conditional upserts rely on it
+    ("stats", "user_id", True),
+    ("history", "user_id", True),
+]
+
+async def ensure_app_indexes(db) -> bool:
+    """
+    Create the indexes the routes rely on; each one fails independently.
+    
+    Returns False if a unique index is missing: login retries and the
+    conditional stats/history upserts depend on those to avoid duplicates.
+    """
+    ready = True
+    try:
+        await ensure_indexes(db)
+    except Exception as e:
+        logger.warning(f"Heartbeat indexes not created: {e}")
+        ready = False
+    for collection, keys, unique in INDEXES:
+        try:
+            await db[collection].create_index(keys, unique=unique)
+        except Exception as e:
+            logger.warning(f"Index {collection}.{keys} not created: {e}")
+            ready = ready and not unique
+    return ready
+
+async def _warm_up(app: FastAPI) -> None:
+    """Establish pooled connections before the first request arrives"""
+    settings = app.state.settings
+    
+    async def warm_mongo():
+        try:
+            await app.state.mongo_client.admin.command("ping")
+            app.state.indexes_ready = await ensure_app_indexes(app.state.db)
+        except Exception as e:
+            logger.warning(f"Mongo warm-up failed: {e}")
+    
+    async def warm_http():
+        try:
+            await app.state.http_client.head(settings.auth_service_url)
+        except Exception as e:
+            logger.warning(f"Auth service warm-up failed: {e}")
+    
+    await asyncio.gather(warm_mongo(), warm_http())
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open and warm the Mongo pool and HTTP client, close them on shutdown"""
+    import httpx
+    from motor.motor_asyncio import AsyncIOMotorClient
+    
+    settings = app.state.settings
+    app.state.mongo_client = AsyncIOMotorClient(
+        settings.mongo_url,
+        minPoolSize=settings.mongo_min_pool_size,
+        maxPoolSize=settings.mongo_max_pool_size,
+        serverSelectionTimeoutMS=settings.mongo_timeout_ms,
+        tz_aware=True
+    )
+    app.state.db = app.state.mongo_client[settings.db_name]
+    app.state.indexes_ready = False
+    app.state.http_client = httpx.AsyncClient(timeout=settings.http_timeout)
+    app.state.process_pool = None
+    app.state.sim_inflight = {}
+    app.state.regrade_jobs = {}
+    app.state.background_tasks = set()
+    app.state.heartbeats = HeartbeatBuffer(
+        app.state.db,
+        flush_interval=settings.heartbeat_flush_interval,
+        max_batch=settings.heartbeat_max_batch,
+        max_pending=settings.heartbeat_max_pending
+    )
+    
+    await _warm_up(app)
+    app.state.heartbeats.start()
+    
+    try:
+        yield
+    finally:
+        for task in app.state.background_tasks:
+            task.cancel()
+        await app.state.heartbeats.stop()
+        if app.state.process_pool is not None:
+            app.state.process_pool.shutdown(cancel_futures=True)
+        await app.state.http_client.aclose()
+        app.state.mongo_client.close()
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    """Build the API app; resources are opened by the lifespan, not here"""
+    if settings is None:
+        settings = Settings.from_env()
+    
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.profile_store = ProfileStore(maxlen=settings.profile_buffer_size)
+    app.state.sim_cache = SimulationCache(maxsize=settings.sim_cache_size)
+    app.state.user_cache = UserDocCache(
+        max_bytes=settings.user_cache_max_bytes,
+        ttl=settings.user_cache_ttl,
+        enabled=settings.user_cache_enabled
+    )
+    
+    app.include_router(api_router)
+    
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=settings.cors_origins,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    
+    if settings.profile_sample_rate > 0 or settings.profile_slow_ms > 0:
+        app.add_middleware(
+            ProfilingMiddleware,
+            store=app.state.profile_store,
+            sample_rate=settings.profile_sample_rate,
+            slow_ms=settings.profile_slow_ms,
+            interval_ms=settings.profile_interval_ms
+        )
+    
+    return app
+
+def __getattr__(name: str):
+    """Build the module-level `app` on first access (`uvicorn server:app`)"""
+    if name == "app":
+        logging.basicConfig(
+            level=logging.INFO,
+            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+        )
+        app = create_app()
+        globals()["app"] = app
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,220 @@
+"""
+Size-bounded request bodies for the sync routes.
+
+The body is collected chunk by chunk under a byte cap: a declared
+Content-Length over the limit is rejected before any byte is read, and
+the running count is checked on every chunk (chunked bodies have no
+Content-Length). The collected bytes are then parsed and validated in a
+single model_validate_json call against typed models, so pydantic-core
+enforces list lengths, string lengths, key counts and value types while
+it parses; no Python code walks the decoded tree.
+
+Stats and settings follow the shapes the frontend keeps in localStorage
+(storage.js / useGameState.js): flat numeric counters, plus the
+mistakes/commonMistakes maps and the counting-trainer sessionHistory.
+The frontend does not upload hands yet, so Hand is the record shape the
+backend reads (hand_codec, grading), not one taken from real uploads.
+"""
+from typing import Annotated, Callable, Dict, List, Literal, Optional, Type, TypeVar, Union
+
+from fastapi import HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import AfterValidator, BaseModel, ConfigDict, Field, StringConstraints, ValidationError
+from typing_extensions import Required, TypedDict
+
+from grading import MAX_CARDS, CardSymbol
+
+MAX_UPLOAD_HANDS = 500
+MAX_SETTINGS_BODY_BYTES = 64 * 1024
+MAX_KEY_LENGTH = 100
+MAX_LABEL_LENGTH = 64
+
+M = TypeVar("M", bound=BaseModel)
+D = TypeVar("D", bound=dict)
+
+# Strict: no "19" -> 19 style coercion from JSON strings
+CLOSED = ConfigDict(strict=True, extra="forbid")
+OPEN = ConfigDict(strict=True, extra="allow")
+
+# --------------------
+# Value types
+# --------------------
+
+Key = Annotated[str, StringConstraints(max_length=MAX_KEY_LENGTH)]
+Label = Annotated[str, StringConstraints(max_length=MAX_LABEL_LENGTH)]
+Number = Union[int, float]
+Scalar = Union[bool, int, float, Label, None]
+Action = Literal["HIT", "STAND", "DOUBLE", "SPLIT", "SURRENDER"]
+Suit = Literal["♥", "♦", "♣", "♠"]
+
+
+def max_entries(limit: int) -> Callable[[D], D]:
+    """Cap the key count of a TypedDict with extra items (Field(max_length) covers plain dicts)"""
+    def check(value: D) -> D:
+        if len(value) > limit:
+            raise ValueError(f"more than {limit} entries")
+        return value
+    return check
+
+
+class Rank(TypedDict):
+    __pydantic_config__ = CLOSED
+
+    value: int
+    symbol: CardSymbol
+
+
+class Card(TypedDict):
+    """frontend Card as serialized by JSON.stringify"""
+    __pydantic_config__ = CLOSED
+
+    rank: Rank
+    suit: Suit
+
+
+Cards = Annotated[List[Card], Field(max_length=MAX_CARDS)]
+
+# --------------------
+# Hands
+# --------------------
+
+class Decision(TypedDict, total=False):
+    """One graded player decision, as read by grading.regrade_histories"""
+    __pydantic_config__ = CLOSED
+
+    playerCards: Cards
+    dealerUpcard: Card
+    trueCount: Optional[Number]
+    action: Action
+    canDouble: bool
+    canSplit: bool
+    canSurrender: bool
+    isCorrect: Optional[bool]
+    optimalAction: Optional[Label]
+
+
+class Hand(TypedDict, total=False):
+    """One hand history record"""
+    __pydantic_config__ = CLOSED
+
+    timestamp: Required[int]
+    id: Label
+    mode: Label
+    playerCards: Cards
+    dealerCards: Cards
+    bet: Number
+    payout: Number
+    insuranceBet: Number
+    bankrollAfter: Number
+    result: Label
+    outcome: Label
+    actions: Annotated[List[Action], Field(max_length=20)]
+    runningCount: int
+    trueCount: Number
+    handIndex: int
+    isSplitChild: bool
+    doubled: bool
+    surrendered: bool
+    insurance: bool
+    decisions: Annotated[List[Decision], Field(max_length=20)]
+    regradedAt: Label
+
+# --------------------
+# Stats and settings
+# --------------------
+
+class Mistake(TypedDict, total=False):
+    """mistakes entry ({count, correct, wrong}) or commonMistakes entry ({wrong: n, correct})"""
+    __pydantic_config__ = CLOSED
+
+    count: int
+    correct: Optional[Label]
+    wrong: Union[int, Label, None]
+
+
+# One entry per hand/upcard situation (a few hundred at most)
+Mistakes = Annotated[Dict[Key, Mistake], Field(max_length=1000)]
+
+GameStats = Annotated[Dict[Key, Number], Field(max_length=100)]
+
+
+class _StrategyStats(TypedDict, total=False, extra_items=Number):
+    __pydantic_config__ = OPEN
+
+    mistakes: Mistakes
+    commonMistakes: Mistakes
+
+
+class _TrainingStats(TypedDict, total=False, extra_items=Number):
+    __pydantic_config__ = OPEN
+
+    sessionHistory: Annotated[List[Annotated[Dict[Key, Scalar], Field(max_length=50)]], Field(max_length=50)]
+
+
+class _Settings(TypedDict, total=False, extra_items=Scalar):
+    """frontend defaultConfig; unknown options may be any scalar"""
+    __pydantic_config__ = OPEN
+
+    numDecks: int
+    startingBankroll: Number
+    minBet: Number
+    blackjackPayout: Number
+    dealerHitsSoft17: bool
+    doubleAfterSplit: bool
+    splitAcesOneCardOnly: bool
+    maxSplits: int
+    insurancePays: Number
+    penetration: Number
+    allowSurrender: bool
+    showHints: bool
+    alwaysShowHints: bool
+
+
+StrategyStats = Annotated[_StrategyStats, AfterValidator(max_entries(100))]
+TrainingStats = Annotated[_TrainingStats, AfterValidator(max_entries(100))]
+Settings = Annotated[_Settings, AfterValidator(max_entries(100))]
+
+
+class SyncData(BaseModel):
+    model_config = CLOSED
+
+    game_stats: Optional[GameStats] = None
+    strategy_stats: Optional[StrategyStats] = None
+    training_stats: Optional[TrainingStats] = None
+    hands: Optional[List[Hand]] = Field(None, max_length=MAX_UPLOAD_HANDS)
+    settings: Optional[Settings] = None
+
+
+class SettingsUpdate(BaseModel):
+    model_config = CLOSED
+
+    settings: Optional[Settings] = None
+
+# --------------------
+# Request bodies
+# --------------------
+
+async def read_json_body(request: Request, model: Type[M], max_bytes: int) -> M:
+    """Read a JSON object body of at most `max_bytes` and validate it against `model`"""
+    declared = request.headers.get("content-length")
+    if declared is not None:
+        if not declared.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid Content-Length")
+        if int(declared) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Request body exceeds {max_bytes} bytes")
+        chunks.append(chunk)
+
+    try:
+        return model.model_validate_json(b"".join(chunks))
+    except ValidationError as exc:
+        errors = exc.errors(include_url=False)
+        if any(error["type"] == "too_long" and error["loc"] == ("hands",) for error in errors):
+            raise HTTPException(status_code=413, detail=f"More than {MAX_UPLOAD_HANDS} hands")
+        raise RequestValidationError([{**error, "loc": ("body", *error["loc"])} for error in errors])
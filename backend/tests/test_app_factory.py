@@ -0,0 +1,113 @@
+"""
+Tests for the app factory, lifespan and readiness probe
+"""
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+from server import INDEXES, create_app, ensure_app_indexes
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+
+class TestAppFactory:
+    """create_app wiring and lifespan-managed resources"""
+
+    def test_import_is_lightweight(self):
+        """Importing server must not connect or pull in motor/httpx"""
+        code = (
+            "import sys, server; "
+            "assert 'motor' not in sys.modules; "
+            "assert 'httpx' not in sys.modules; "
+            "assert 'app' not in vars(server)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True
+        )
+        assert result.returncode == 0, result.stderr
+
+    def test_root_route(self, unreachable_settings):
+        with TestClient(create_app(unreachable_settings())) as client:
+            response = client.get("/api/")
+            assert response.status_code == 200
+            assert response.json()["message"] == "Blackjack Trainer API"
+
+    def test_ready_reports_unreachable_mongo(self, unreachable_settings):
+        with TestClient(create_app(unreachable_settings())) as client:
+            response = client.get("/api/ready")
+            assert response.status_code == 503
+            data = response.json()
+            assert data["status"] == "not_ready"
+            assert data["checks"]["mongo"].startswith("error")
+            assert data["checks"]["indexes"] == "missing"
+            assert data["checks"]["http_client"] == "ok"
+
+    def test_lifespan_closes_resources(self, unreachable_settings):
+        app = create_app(unreachable_settings())
+        with TestClient(app):
+            assert not app.state.http_client.is_closed
+        assert app.state.http_client.is_closed
+
+    def test_profiling_middleware_opt_in(self, unreachable_settings):
+        app = create_app(unreachable_settings())
+        assert not any(m.cls.__name__ == "ProfilingMiddleware" for m in app.user_middleware)
+        app = create_app(unreachable_settings(profile_slow_ms=250))
+        assert any(m.cls.__name__ == "ProfilingMiddleware" for m in app.user_middleware)
+
+    def test_admin_routes_require_token(self, unreachable_settings):
+        app = create_app(unreachable_settings(admin_token="secret"))
+        with TestClient(app) as client:
+            assert client.get("/api/admin/profiles").status_code == 403
+            response = client.get("/api/admin/profiles", headers={"X-Admin-Token": "secret"})
+            assert response.status_code == 200
+            assert response.json()["profiles"] == []
+
+    def test_status_post_is_buffered(self, unreachable_settings):
+        """Heartbeats are accepted without a Mongo round trip"""
+        app = create_app(unreachable_settings(heartbeat_flush_interval=60))
+        with TestClient(app) as client:
+            response = client.post("/api/status", json={"client_name": "probe"})
+            assert response.status_code == 200
+            assert response.json()["client_name"] == "probe"
+            assert app.state.heartbeats.pending == 1
+
+
+class IndexCollection:
+    """Collection double recording create_index calls"""
+
+    def __init__(self, created, fail):
+        self.created = created
+        self.fail = fail
+
+    async def create_index(self, keys, unique=False):
+        if self.fail:
+            raise ConnectionError("mongo down")
+        self.created.append((keys, unique))
+
+
+class IndexDb(dict):
+    def __init__(self, failing=()):
+        super().__init__()
+        self.failing = set(failing)
+        self.created = []
+
+    def __missing__(self, name):
+        self[name] = IndexCollection(self.created, name in self.failing)
+        return self[name]
+
+
+class TestEnsureAppIndexes:
+    """Index creation at warm-up"""
+
+    def test_heartbeat_failure_does_not_skip_unique_indexes(self):
+        db = IndexDb(failing={"status_buckets"})
+        assert asyncio.run(ensure_app_indexes(db)) is False
+        assert ("email", True) in db.created
+        assert len(db.created) == len(INDEXES)
+
+    def test_only_missing_unique_indexes_block_readiness(self):
+        assert asyncio.run(ensure_app_indexes(IndexDb(failing={"user_sessions"}))) is True
+        assert asyncio.run(ensure_app_indexes(IndexDb(failing={"stats"}))) is False
@@ -0,0 +1,100 @@
+"""
+Tests for login: user upsert and session replacement
+"""
+import asyncio
+
+import httpx
+from fastapi.testclient import TestClient
+
+from server import create_app, replace_sessions, upsert_user
+
+
+def session(user_id, token):
+    return {
+        "user_id": user_id,
+        "session_token": token,
+        "expires_at": "2099-01-01T00:00:00+00:00",
+        "created_at": "2026-01-01T00:00:00+00:00",
+    }
+
+
+class TestUpsertUser:
+    """Find-or-create in one round trip"""
+
+    def test_creates_then_updates(self, memory_collection, memory_db):
+        db = memory_db(users=memory_collection())
+        created = asyncio.run(upsert_user(db, "a@example.com", "A", None))
+        assert created["email"] == "a@example.com"
+        assert created["user_id"].startswith("user_")
+        assert created["settings"] == {}
+        again = asyncio.run(upsert_user(db, "a@example.com", "A2", "pic.png"))
+        assert again["user_id"] == created["user_id"]
+        assert again["created_at"] == created["created_at"]
+        assert again["name"] == "A2" and again["picture"] == "pic.png"
+        _, _, update = db.users.calls[0]
+        assert set(update["$set"]) == {"name", "picture", "last_sync"}
+        assert set(update["$setOnInsert"]) == {"user_id", "email", "created_at", "settings"}
+
+    def test_retries_once_on_duplicate_key(self, memory_collection, memory_db):
+        db = memory_db(users=memory_collection(duplicate_errors=1))
+        user = asyncio.run(upsert_user(db, "a@example.com", "A", None))
+        assert user["email"] == "a@example.com"
+        assert len(db.users.calls) == 2
+
+
+class TestReplaceSessions:
+    """Logging in revokes every earlier session of the user"""
+
+    def test_revokes_all_other_sessions(self, memory_collection, memory_db):
+        sessions = memory_collection([session("u1", "old-1"), session("u1", "old-2"), session("u2", "other")])
+        db = memory_db(user_sessions=sessions)
+        asyncio.run(replace_sessions(db, "u1", "new"))
+        assert sorted((d["user_id"], d["session_token"]) for d in sessions.docs) == [("u1", "new"), ("u2", "other")]
+
+    def test_concurrent_logins_keep_the_newest_session(self, memory_collection, memory_db):
+        """replace(A), replace(B), delete(older than A), delete(older than B)"""
+        class DeferredDeletes(memory_collection):
+            async def replace_one(self, query, replacement, upsert=False):
+                await super().replace_one(query, replacement, upsert)
+                if sum(call[0] == "replace_one" for call in self.calls) == 2:
+                    self.both_replaced.set()
+
+            async def delete_many(self, query):
+                await self.both_replaced.wait()
+                await super().delete_many(query)
+
+        async def run():
+            sessions.both_replaced = asyncio.Event()
+            await asyncio.gather(replace_sessions(db, "u1", "tab-a"), replace_sessions(db, "u1", "tab-b"))
+
+        sessions = DeferredDeletes([session("u1", "old")])
+        db = memory_db(user_sessions=sessions)
+        asyncio.run(run())
+        tokens = {d["session_token"] for d in sessions.docs}
+        assert "old" not in tokens
+        assert "tab-b" in tokens
+
+    def test_create_session_route(self, memory_collection, memory_db, unreachable_settings):
+        def auth_service(request):
+            assert request.headers["X-Session-ID"] == "sid"
+            return httpx.Response(200, json={
+                "email": "a@example.com", "name": "A", "session_token": "tok-new"
+            })
+
+        app = create_app(unreachable_settings())
+        db = memory_db(users=memory_collection(), user_sessions=memory_collection([session("u-any", "x")]))
+        with TestClient(app) as client:
+            real_db, real_http = app.state.db, app.state.http_client
+            app.state.db = db
+            app.state.http_client = httpx.AsyncClient(transport=httpx.MockTransport(auth_service))
+            try:
+                response = client.post("/api/auth/session", json={"session_id": "sid"})
+            finally:
+                client.portal.call(app.state.http_client.aclose)
+                app.state.db, app.state.http_client = real_db, real_http
+        assert response.status_code == 200
+        body = response.json()
+        assert body["session_token"] == "tok-new"
+        user_id = body["user"]["user_id"]
+        assert {"user_id": user_id, "session_token": "tok-new"}.items() <= db.user_sessions.docs[-1].items()
+        assert response.cookies.get("session_token") == "tok-new"
@@ -0,0 +1,72 @@
+"""
+Unit tests for the bankroll / risk-of-ruin simulator
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from pydantic import ValidationError
+
+from bankroll import SimulationCache, SimulationParams, base_edge, input_hash, simulate
+
+SPREAD = [
+    {"true_count": -10, "units": 1},
+    {"true_count": 2, "units": 4},
+    {"true_count": 4, "units": 8},
+]
+
+
+def params(**overrides):
+    values = dict(bet_ramp=SPREAD, bankroll=2000, hands=2000, trajectories=300, seed=1)
+    values.update(overrides)
+    return SimulationParams(**values)
+
+
+class TestSimulation:
+    """Statistics produced by the simulator"""
+
+    def test_flat_bet_tracks_base_edge(self):
+        p = params(bet_ramp=[{"true_count": 0, "units": 1}], hands=5000, trajectories=400, bankroll=100000)
+        result = simulate(p)
+        assert result["average_bet"] == pytest.approx(10.0)
+        assert result["ev_per_hand"] / 10 == pytest.approx(base_edge(p), abs=0.004)
+        assert result["n0"] is None
+        assert result["risk_of_ruin_lifetime"] == 1.0
+
+    def test_spread_beats_flat_betting(self):
+        spread = simulate(params(hands=5000, bankroll=100000))
+        flat = simulate(params(hands=5000, bankroll=100000, bet_ramp=[{"true_count": 0, "units": 1}]))
+        assert spread["ev_per_hand"] > flat["ev_per_hand"]
+        assert spread["sd_per_100"] > flat["sd_per_100"]
+
+    def test_smaller_bankroll_means_more_ruin(self):
+        assert simulate(params(bankroll=300))["risk_of_ruin"] > simulate(params(bankroll=5000))["risk_of_ruin"]
+
+    def test_deterministic_and_executor_independent(self):
+        p = params(trajectories=600)
+        with ThreadPoolExecutor(2) as executor:
+            assert simulate(p, executor) == simulate(p)
+
+    def test_worse_rules_lower_edge(self):
+        assert base_edge(params(blackjack_payout=1.2)) < base_edge(params())
+        assert base_edge(params(dealer_hits_soft17=True)) < base_edge(params())
+
+
+class TestParamsAndCache:
+    """Input hashing, validation and memoization"""
+
+    def test_hash_ignores_ramp_order(self):
+        assert input_hash(params()) == input_hash(params(bet_ramp=list(reversed(SPREAD))))
+        assert input_hash(params()) != input_hash(params(seed=2))
+
+    def test_workload_is_bounded(self):
+        with pytest.raises(ValidationError):
+            params(hands=200000, trajectories=20000)
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = SimulationCache(maxsize=2)
+        cache.put("a", {"n": 1})
+        cache.put("b", {"n": 2})
+        cache.get("a")
+        cache.put("c", {"n": 3})
+        assert cache.get("b") is None
+        assert cache.get("a") == {"n": 1}
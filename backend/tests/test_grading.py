@@ -0,0 +1,167 @@
+"""
+Unit tests for bulk decision grading and history re-scoring
+"""
+import pytest
+from pydantic import ValidationError
+
+from grading import GradeItem, grade, regrade_histories
+from hand_codec import decode_hands, encode_hands
+
+
+def card(symbol, suit="♠"):
+    values = {"J": 10, "Q": 10, "K": 10, "A": 11}
+    return {"rank": {"value": values.get(symbol) or int(symbol), "symbol": symbol}, "suit": suit}
+
+
+class TestGrade:
+    """Verdicts match basicStrategy.js getOptimalAction"""
+
+    def optimal(self, cards, upcard, **flags):
+        item = {"player_cards": cards, "dealer_upcard": upcard, "action": "HIT", **flags}
+        return grade([item])["optimal_action"][0]
+
+    def test_hard_soft_and_pairs(self):
+        assert self.optimal(["10", "2"], "4") == "STAND"
+        assert self.optimal(["10", "2"], "2") == "HIT"
+        assert self.optimal(["A", "7"], "3") == "DOUBLE"
+        assert self.optimal(["A", "7", "2"], "3") == "STAND"
+        assert self.optimal(["A", "A"], "A") == "SPLIT"
+        assert self.optimal(["5", "5"], "9") == "DOUBLE"
+        assert self.optimal(["K", "Q"], "6") == "STAND"
+
+    def test_rule_flags_resolve_chart_codes(self):
+        assert self.optimal(["10", "6"], "K") == "SURRENDER"
+        assert self.optimal(["10", "6"], "K", can_surrender=False) == "HIT"
+        assert self.optimal(["A", "7"], "3", can_double=False) == "STAND"
+        assert self.optimal(["2", "2"], "2", can_split=False) == "HIT"
+        assert self.optimal(["5", "4", "2"], "6") == "HIT"
+
+    def test_deviations(self):
+        assert self.optimal(["10", "6"], "K", true_count=0) == "STAND"
+        assert self.optimal(["10", "6"], "K", true_count=-1) == "SURRENDER"
+        assert self.optimal(["10", "2"], "3", true_count=2) == "STAND"
+        assert self.optimal(["10", "3"], "2", true_count=-1) == "HIT"
+        assert self.optimal(["10", "3"], "2", true_count=0) == "STAND"
+        assert self.optimal(["10", "4"], "10", true_count=3) == "SURRENDER"
+        assert self.optimal(["10", "4"], "10", true_count=3, can_surrender=False) == "HIT"
+        assert self.optimal(["10", "6"], "K", true_count=0, show_deviations=False) == "SURRENDER"
+
+    def test_batch_correctness_flags(self):
+        items = [
+            {"player_cards": ["10", "6"], "dealer_upcard": "7", "action": "hit"},
+            {"player_cards": ["10", "6"], "dealer_upcard": "7", "action": "STAND"},
+            {"player_cards": [card("10"), card("6")], "dealer_upcard": card("7"), "action": "HIT"},
+        ]
+        result = grade(items)
+        assert result["is_correct"] == [True, False, True]
+        assert result["is_deviation"] == [False, False, False]
+
+    def test_request_model_rejects_unknown_symbols_and_actions(self):
+        assert GradeItem(player_cards=["10", "6"], dealer_upcard="7", action="hit").action == "HIT"
+        with pytest.raises(ValidationError):
+            GradeItem(player_cards=["Z", "Z"], dealer_upcard="7", action="HIT")
+        with pytest.raises(ValidationError):
+            GradeItem(player_cards=["10", "6"], dealer_upcard="foo", action="HIT")
+        with pytest.raises(ValidationError):
+            GradeItem(player_cards=["10", "6"], dealer_upcard="7", action="FOLD")
+
+
+class TestRegrade:
+    """Re-scoring decisions stored in hand histories"""
+
+    def history(self, is_correct):
+        decision = {
+            "playerCards": [card("10"), card("6")],
+            "dealerUpcard": card("K"),
+            "trueCount": 1,
+            "action": "STAND",
+            "canSurrender": True,
+            "isCorrect": is_correct,
+            "optimalAction": "HIT",
+        }
+        hands = [{"timestamp": 1000, "result": "WIN", "decisions": [decision]}]
+        return {"user_id": "u1", "updated_at": "t0", "hands_blob": encode_hands(hands)}
+
+    def test_flipped_decision_adjusts_stats(self):
+        [result] = regrade_histories([self.history(is_correct=False)])
+        assert result["decisions_changed"] == 1
+        assert result["correct_delta"] == 1
+        assert result["mistakes"] == {"16_vs_K": {"count": -1, "correct": "STAND", "wrong": "STAND"}}
+        hand = decode_hands(result["hands_blob"])[0]
+        assert hand["regradedAt"] == result["regraded_at"]
+        decision = hand["decisions"][0]
+        assert decision["isCorrect"] is True
+        assert decision["optimalAction"] == "STAND"
+
+    def test_unchanged_history_is_skipped(self):
+        doc = self.history(is_correct=True)
+        hands = decode_hands(doc["hands_blob"])
+        hands[0]["decisions"][0]["optimalAction"] = "STAND"
+        doc["hands_blob"] = encode_hands(hands)
+        assert regrade_histories([doc]) == []
+
+    def test_hands_without_decisions(self):
+        doc = {"user_id": "u2", "hands": [{"timestamp": 1, "result": "win"}]}
+        assert regrade_histories([doc]) == []
+
+    def test_malformed_decisions_are_ignored(self):
+        doc = self.history(is_correct=False)
+        hands = decode_hands(doc["hands_blob"])
+        hands.append({"timestamp": 900, "decisions": 5})
+        hands.append({"timestamp": 800, "decisions": [{**hands[0]["decisions"][0], "playerCards": 5}]})
+        hands.append({"timestamp": 700, "decisions": [
+            {**hands[0]["decisions"][0], "dealerUpcard": {"rank": {"symbol": "$x.y"}}, "isCorrect": True}
+        ]})
+        doc["hands_blob"] = encode_hands(hands)
+        [result] = regrade_histories([doc])
+        assert result["decisions_changed"] == 1
+        assert list(result["mistakes"]) == ["16_vs_K"]
+
+    def test_one_bad_document_does_not_stop_the_chunk(self):
+        broken = {"user_id": "bad", "hands_blob": b"\x09garbage"}
+        results = regrade_histories([broken, self.history(is_correct=False)])
+        assert results[0]["user_id"] == "bad" and "error" in results[0]
+        assert results[1]["user_id"] == "u1" and results[1]["decisions_changed"] == 1
+
+
+class TestRegradeSurvivesSync:
+    """Client syncs after a regrade do not undo it"""
+
+    def test_stale_client_copy_does_not_replace_regraded_hand(self):
+        from server import merge_hand_history
+
+        stored = [{"timestamp": 1000, "isCorrect": True, "regradedAt": "2026-01-30T00:00:00+00:00"}]
+        uploaded = [{"timestamp": 2000}, {"timestamp": 1000, "isCorrect": False}]
+        merged = merge_hand_history(uploaded, stored)
+        assert merged == [{"timestamp": 2000}, stored[0]]
+        # Without a regrade the uploaded copy still wins
+        assert merge_hand_history(uploaded, [{"timestamp": 1000}])[1] == uploaded[1]
+
+    def test_adjustments_survive_max_merge(self):
+        from server import merge_stats, stats_response
+
+        doc = {
+            "user_id": "u1",
+            "strategy_stats": {"correctDecisions": 10, "mistakes": {"16_vs_K": {"count": 2, "correct": "HIT", "wrong": "STAND"}}},
+            "regrade_adjustments": {"correctDecisions": 1, "mistakes": {"16_vs_K": {"count": -1}}},
+        }
+        # The client re-sends its pre-regrade counters
+        doc["strategy_stats"] = merge_stats(doc["strategy_stats"], {"correctDecisions": 10})
+        served = stats_response(doc)
+        assert "regrade_adjustments" not in served
+        assert served["strategy_stats"]["correctDecisions"] == 11
+        assert served["strategy_stats"]["mistakes"]["16_vs_K"] == {"count": 1, "correct": "HIT", "wrong": "STAND"}
+
+    def test_negative_adjustment_never_creates_entries(self):
+        from server import stats_response
+
+        doc = {
+            "strategy_stats": {"correctDecisions": 0, "mistakes": {"12_vs_2": {"count": 1}}},
+            "regrade_adjustments": {
+                "correctDecisions": -3,
+                "mistakes": {"12_vs_2": {"count": -2}, "16_vs_K": {"count": -1}, "15_vs_A": {"count": 1, "correct": "HIT", "wrong": "STAND"}},
+            },
+        }
+        strategy = stats_response(doc)["strategy_stats"]
+        assert strategy["correctDecisions"] == 0
+        assert strategy["mistakes"] == {"15_vs_A": {"count": 1, "correct": "HIT", "wrong": "STAND"}}
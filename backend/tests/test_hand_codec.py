@@ -0,0 +1,60 @@
+"""
+Unit tests for the binary hand history encoding
+"""
+import json
+
+import pytest
+
+from benchmarks.bench_hand_codec import sample_hands
+from hand_codec import HandCodecError, decode_hands, encode_hands
+
+
+class TestHandCodec:
+    """Round-tripping and size of encoded histories"""
+
+    def test_round_trip_sample_history(self):
+        hands = sample_hands(200)
+        assert decode_hands(encode_hands(hands)) == hands
+
+    def test_at_least_five_times_smaller_than_json(self):
+        hands = sample_hands(200)
+        json_size = len(json.dumps(hands, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        assert json_size / len(encode_hands(hands)) >= 5
+
+    def test_card_is_one_byte(self):
+        card = {"rank": {"value": 11, "symbol": "A"}, "suit": "♠"}
+        one = encode_hands([{"timestamp": 1, "playerCards": [card]}])
+        two = encode_hands([{"timestamp": 1, "playerCards": [card, card]}])
+        assert len(two) - len(one) == 1
+
+    def test_arbitrary_json_round_trips(self):
+        hands = [
+            {"timestamp": 123456789, "result": "win"},
+            {"timestamp": "2026-01-30T00:00:00Z", "note": "free text ✓", "nested": {"a": [1, 2.5, None, True]}},
+            {"cards": [{"rank": "A", "suit": "♠"}], "big": 2 ** 70, "neg": -5},
+            {"timestamp": 123456790, "playerCards": [], "x": {}},
+        ]
+        assert decode_hands(encode_hands(hands)) == hands
+
+    def test_empty_history(self):
+        assert decode_hands(encode_hands([])) == []
+        assert decode_hands(b"") == []
+
+    def test_corrupt_blob_raises(self):
+        blob = encode_hands(sample_hands(3))
+        with pytest.raises(HandCodecError):
+            decode_hands(blob[:-2])
+        with pytest.raises(HandCodecError):
+            decode_hands(b"\x09" + blob[1:])
+
+    def test_bankroll_after_is_a_table_key(self):
+        hand = {"timestamp": 1, "bankrollAfter": 1000}
+        assert decode_hands(encode_hands([hand])) == [hand]
+        assert b"bankrollAfter" not in encode_hands([hand])
+
+    def test_corrupt_stored_blob_reads_as_legacy_history(self):
+        from server import load_hands
+
+        assert load_hands({"user_id": "u1", "hands_blob": b"\x09\x01"}) == []
+        legacy = [{"timestamp": 5}]
+        assert load_hands({"user_id": "u1", "hands_blob": b"\x01\x05", "hands": legacy}) == legacy
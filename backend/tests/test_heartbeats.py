@@ -0,0 +1,140 @@
+"""
+Unit tests for buffered heartbeat ingestion
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from heartbeats import BUCKETS_COLLECTION, HeartbeatBuffer, build_bucket_updates, status_query_pipeline
+
+T0 = datetime(2026, 1, 30, 12, 0, 5, tzinfo=timezone.utc)
+
+
+class RecordingCollection:
+    """Collection double that records bulk writes"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.writes = []
+
+    async def bulk_write(self, requests, ordered=True):
+        if self.fail:
+            raise ConnectionError("mongo down")
+        self.writes.append(requests)
+
+
+def make_check(client_name, timestamp, n=0):
+    return {"id": f"{client_name}-{n}", "client_name": client_name, "timestamp": timestamp}
+
+
+class TestBucketing:
+    """Grouping heartbeats into per-client, per-minute buckets"""
+
+    def test_one_upsert_per_client_minute(self):
+        checks = [
+            make_check("a", T0, 1),
+            make_check("a", T0 + timedelta(seconds=30), 2),
+            make_check("a", T0 + timedelta(minutes=1), 3),
+            make_check("b", T0, 4),
+        ]
+        updates = build_bucket_updates(checks)
+        assert len(updates) == 3
+        entries = [{"id": c["id"], "timestamp": c["timestamp"]} for c in checks[:2]]
+        assert updates[0] == UpdateOne(
+            {"client_name": "a", "bucket_start": T0.replace(second=0)},
+            {
+                "$push": {"checks": {"$each": entries}},
+                "$inc": {"count": 2},
+                "$min": {"first_ts": T0},
+                "$max": {"last_ts": T0 + timedelta(seconds=30)},
+            },
+            upsert=True
+        )
+
+    def test_pipeline_is_time_ranged_and_paginated(self):
+        pipeline = status_query_pipeline(T0, T0 + timedelta(hours=1), "a", skip=10, limit=5)
+        assert pipeline[0]["$match"]["client_name"] == "a"
+        assert pipeline[0]["$match"]["bucket_start"]["$gte"] == T0.replace(second=0)
+        assert {"$skip": 10} in pipeline
+        assert {"$limit": 5} in pipeline
+
+
+class TestHeartbeatBuffer:
+    """Batching, retry and shutdown flush"""
+
+    def test_flush_writes_single_batch(self):
+        collection = RecordingCollection()
+        buffer = HeartbeatBuffer({BUCKETS_COLLECTION: collection})
+        for n in range(50):
+            buffer.add(make_check("a", T0, n))
+        assert asyncio.run(buffer.flush()) == 50
+        assert len(collection.writes) == 1
+        assert buffer.pending == 0
+
+    def test_failed_flush_requeues(self):
+        collection = RecordingCollection(fail=True)
+        buffer = HeartbeatBuffer({BUCKETS_COLLECTION: collection})
+        buffer.add(make_check("a", T0))
+        assert asyncio.run(buffer.flush()) == 0
+        assert buffer.pending == 1
+
+    def test_partial_failure_requeues_only_failed_buckets(self):
+        """Upserts that were applied are not pushed again on the next flush"""
+        class PartlyFailingCollection:
+            async def bulk_write(self, requests, ordered=True):
+                assert ordered is False
+                raise BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}]})
+
+        buffer = HeartbeatBuffer({BUCKETS_COLLECTION: PartlyFailingCollection()})
+        checks = [make_check("a", T0, 1), make_check("b", T0, 2), make_check("b", T0, 3)]
+        for check in checks:
+            buffer.add(check)
+        assert asyncio.run(buffer.flush()) == 1
+        assert buffer.pending == 2
+
+        retried = RecordingCollection()
+        buffer.db = {BUCKETS_COLLECTION: retried}
+        assert asyncio.run(buffer.flush()) == 2
+        assert retried.writes == [build_bucket_updates(checks[1:])]
+
+    def test_pending_is_capped(self):
+        buffer = HeartbeatBuffer({BUCKETS_COLLECTION: RecordingCollection()}, max_pending=3)
+        for n in range(5):
+            buffer.add(make_check("a", T0, n))
+        assert buffer.pending == 3
+        assert buffer.dropped == 2
+
+    def test_requeue_keeps_newest_within_cap(self):
+        """Checks that arrive while a failing write is in flight win over the oldest"""
+        class SlowFailingCollection:
+            async def bulk_write(self, requests, ordered=True):
+                await asyncio.sleep(0.01)
+                raise ConnectionError("mongo down")
+
+        buffer = HeartbeatBuffer({BUCKETS_COLLECTION: SlowFailingCollection()}, max_pending=3)
+        for n in range(3):
+            buffer.add(make_check("a", T0, n))
+
+        async def run():
+            flushing = asyncio.ensure_future(buffer.flush())
+            await asyncio.sleep(0)
+            buffer.add(make_check("a", T0, 3))
+            await flushing
+
+        asyncio.run(run())
+        assert buffer.pending == 3
+        assert buffer.dropped == 1
+
+    def test_stop_flushes_remaining(self):
+        collection = RecordingCollection()
+
+        async def run():
+            buffer = HeartbeatBuffer({BUCKETS_COLLECTION: collection}, flush_interval=60)
+            buffer.start()
+            buffer.add(make_check("a", T0))
+            await buffer.stop()
+
+        asyncio.run(run())
+        assert sum(len(w) for w in collection.writes) == 1
@@ -0,0 +1,116 @@
+"""
+Unit tests for the request profiling middleware
+"""
+import asyncio
+import time
+
+from profiling import AWAITING, ProfileStore, ProfilingMiddleware, collapsed_text
+
+
+async def slow_app(scope, receive, send):
+    time.sleep(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def spin_first(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def spin_second(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+async def first_app(scope, receive, send):
+    spin_first(0.05)
+    await asyncio.sleep(0.06)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+
+
+async def second_app(scope, receive, send):
+    await asyncio.sleep(0.01)
+    spin_second(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+
+
+def make_call(middleware, path, sent):
+    scope = {"type": "http", "method": "POST", "path": path}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    return middleware(scope, receive, send)
+
+
+def run_request(middleware, path="/api/sync/full"):
+    sent = []
+    asyncio.run(make_call(middleware, path, sent))
+    return sent
+
+
+class TestProfilingMiddleware:
+    """Capture rules and ring buffer behaviour"""
+
+    def test_slow_request_is_captured(self):
+        store = ProfileStore(maxlen=5)
+        middleware = ProfilingMiddleware(slow_app, store, slow_ms=10, interval_ms=1)
+        sent = run_request(middleware)
+        assert sent[0]["status"] == 200
+        profiles = store.list()
+        assert len(profiles) == 1
+        assert profiles[0]["reason"] == "slow"
+        assert profiles[0]["path"] == "/api/sync/full"
+        assert "stacks" not in profiles[0]
+        text = collapsed_text(store.get(profiles[0]["id"]))
+        assert "slow_app" in text
+
+    def test_fast_request_not_captured(self):
+        store = ProfileStore(maxlen=5)
+        middleware = ProfilingMiddleware(slow_app, store, slow_ms=10_000, interval_ms=1)
+        run_request(middleware)
+        assert store.list() == []
+
+    def test_sample_rate_captures(self):
+        store = ProfileStore(maxlen=5)
+        middleware = ProfilingMiddleware(slow_app, store, sample_rate=1.0, interval_ms=1)
+        run_request(middleware)
+        assert store.list()[0]["reason"] == "sampled"
+
+    def test_admin_paths_excluded(self):
+        store = ProfileStore(maxlen=5)
+        middleware = ProfilingMiddleware(slow_app, store, sample_rate=1.0, interval_ms=1)
+        run_request(middleware, path="/api/admin/profiles")
+        assert store.list() == []
+
+    def test_ring_buffer_is_bounded(self):
+        store = ProfileStore(maxlen=2)
+        middleware = ProfilingMiddleware(slow_app, store, sample_rate=1.0, interval_ms=1)
+        for _ in range(3):
+            run_request(middleware)
+        assert len(store.list()) == 2
+
+    def test_event_loop_samples_attributed_to_running_request(self):
+        """A profile excludes loop time spent on other concurrent requests"""
+        store = ProfileStore(maxlen=5)
+        first = ProfilingMiddleware(first_app, store, sample_rate=1.0, interval_ms=1)
+        second = ProfilingMiddleware(second_app, store, sample_rate=1.0, interval_ms=1)
+        second.sampler = first.sampler
+
+        async def both():
+            await asyncio.gather(
+                make_call(first, "/first", []),
+                make_call(second, "/second", []),
+            )
+
+        asyncio.run(both())
+        texts = {p["path"]: collapsed_text(store.get(p["id"])) for p in store.list()}
+        assert "spin_first" in texts["/first"] and "spin_second" not in texts["/first"]
+        assert "spin_second" in texts["/second"] and "spin_first" not in texts["/second"]
+        assert AWAITING in texts["/first"]
@@ -0,0 +1,129 @@
+"""
+Unit tests for typed, size-bounded sync uploads
+"""
+import json
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from sync_payloads import MAX_UPLOAD_HANDS, SyncData, read_json_body
+
+HAND = {
+    "timestamp": 1769774400000,
+    "playerCards": [{"rank": {"value": 10, "symbol": "K"}, "suit": "♠"}],
+    "result": "WIN",
+    "bet": 25,
+}
+BODY = {
+    "game_stats": {"handsPlayed": 19, "totalWon": 12.5},
+    "strategy_stats": {"commonMistakes": {"16_vs_10": {"wrong": 5, "correct": "STAND"}}},
+    "training_stats": {},
+    "hands": [HAND, {**HAND, "timestamp": 1769774300000}],
+    "settings": None,
+}
+
+
+def make_app(max_bytes=4096):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        data = await read_json_body(request, SyncData, max_bytes)
+        return {"hands": len(data.hands or [])}
+
+    return app
+
+
+class TestSyncDataTypes:
+    """Typed stats, hand and settings shapes"""
+
+    def test_accepts_frontend_payload(self):
+        data = SyncData.model_validate_json(json.dumps(BODY))
+        assert data.hands == BODY["hands"]
+        assert data.strategy_stats == BODY["strategy_stats"]
+        assert data.game_stats == {"handsPlayed": 19, "totalWon": 12.5}
+
+    def test_only_sent_hand_fields_are_kept(self):
+        data = SyncData.model_validate_json(json.dumps({"hands": [{"timestamp": 5}]}))
+        assert data.hands == [{"timestamp": 5}]
+
+    @pytest.mark.parametrize("body", [
+        {"hands": [], "extra": 1},
+        {"hands": [{**HAND, "note": "free text"}]},
+        {"hands": [{"bet": 25}]},
+        {"hands": [{**HAND, "playerCards": [{"rank": {"value": 1, "symbol": "Z"}, "suit": "♠"}]}]},
+        {"hands": [{**HAND, "actions": ["FOLD"]}]},
+        {"game_stats": {"handsPlayed": "19"}},
+        {"strategy_stats": {"totalDecisions": {"nested": 1}}},
+        {"strategy_stats": {"mistakes": {"16_vs_10": {"count": 1, "extra": True}}}},
+        {"settings": {"numDecks": "six"}},
+        {"settings": {"theme": {"nested": True}}},
+    ])
+    def test_rejects_wrong_shapes(self, body):
+        with pytest.raises(ValidationError):
+            SyncData.model_validate_json(json.dumps(body))
+
+    def test_rejects_too_many_keys(self):
+        with pytest.raises(ValidationError, match="at most 100 items"):
+            SyncData.model_validate_json(json.dumps({"game_stats": {str(i): i for i in range(101)}}))
+        with pytest.raises(ValidationError, match="more than 100 entries"):
+            SyncData.model_validate_json(json.dumps({"strategy_stats": {str(i): i for i in range(101)}}))
+
+    def test_rejects_long_strings(self):
+        with pytest.raises(ValidationError, match="at most 64 characters"):
+            SyncData.model_validate_json(json.dumps({"hands": [{**HAND, "result": "x" * 65}]}))
+        with pytest.raises(ValidationError, match="at most 100 characters"):
+            SyncData.model_validate_json(json.dumps({"game_stats": {"k" * 101: 1}}))
+
+    def test_deep_nesting_is_invalid_json(self):
+        with pytest.raises(ValidationError, match="recursion limit"):
+            SyncData.model_validate_json('{"game_stats": ' + "[" * 100000 + "]" * 100000 + "}")
+
+
+class TestReadJsonBody:
+    """Request body handling end to end"""
+
+    def test_valid_body(self):
+        with TestClient(make_app()) as client:
+            response = client.post("/upload", json=BODY)
+        assert response.status_code == 200
+        assert response.json() == {"hands": 2}
+
+    def test_rejects_declared_oversize_body(self):
+        with TestClient(make_app(max_bytes=100)) as client:
+            response = client.post("/upload", json=BODY)
+        assert response.status_code == 413
+
+    def test_rejects_oversize_chunked_body(self):
+        def chunks():
+            yield b'{"hands": ['
+            for _ in range(100):
+                yield b'{"bet": 1},'
+        with TestClient(make_app(max_bytes=200)) as client:
+            response = client.post("/upload", content=chunks())
+        assert response.status_code == 413
+
+    def test_invalid_json_is_422(self):
+        with TestClient(make_app()) as client:
+            response = client.post("/upload", content=b'{"hands": [')
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["type"] == "json_invalid"
+
+    def test_deeply_nested_body_is_422(self):
+        with TestClient(make_app(max_bytes=1_000_000)) as client:
+            response = client.post("/upload", content=b'{"game_stats": ' + b"[" * 200000 + b"]" * 200000 + b"}")
+        assert response.status_code == 422
+
+    def test_too_many_hands_is_413(self):
+        hands = [{"timestamp": i + 1} for i in range(MAX_UPLOAD_HANDS + 1)]
+        with TestClient(make_app(max_bytes=1_000_000)) as client:
+            response = client.post("/upload", json={"hands": hands})
+        assert response.status_code == 413
+
+    def test_validation_errors_are_422(self):
+        with TestClient(make_app()) as client:
+            response = client.post("/upload", json={"settings": {"a": "x" * 2000}})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["loc"][:2] == ["body", "settings"]
@@ -0,0 +1,150 @@
+"""
+Unit tests for the per-user document cache
+"""
+import asyncio
+import time
+from types import SimpleNamespace
+
+from user_cache import UserDocCache, document_size
+
+
+def stats_doc(user_id, padding=0):
+    return {"user_id": user_id, "game_stats": {"handsPlayed": 10}, "pad": "x" * padding}
+
+
+class TestUserDocCache:
+    """Write-through LRU keyed by collection and user"""
+
+    def test_miss_then_hit(self):
+        cache = UserDocCache()
+        assert cache.get("stats", "u1") is None
+        cache.put("stats", "u1", stats_doc("u1"))
+        assert cache.get("stats", "u1") == stats_doc("u1")
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_collections_are_separate(self):
+        cache = UserDocCache()
+        cache.put("stats", "u1", stats_doc("u1"))
+        assert cache.get("history", "u1") is None
+
+    def test_returns_copies(self):
+        """Mutating a returned or stored document does not touch the cache"""
+        cache = UserDocCache()
+        doc = stats_doc("u1")
+        cache.put("stats", "u1", doc)
+        doc["game_stats"]["handsPlayed"] = 99
+        cached = cache.get("stats", "u1")
+        cached["game_stats"]["handsPlayed"] = 42
+        assert cache.get("stats", "u1")["game_stats"]["handsPlayed"] == 10
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        ids = [f"u{i:02d}" for i in range(17)]
+        size = document_size(stats_doc(ids[0], 1000))
+        cache = UserDocCache(max_bytes=size * 16)
+        for user_id in ids[:16]:
+            cache.put("stats", user_id, stats_doc(user_id, 1000))
+        cache.get("stats", ids[0])
+        cache.put("stats", ids[16], stats_doc(ids[16], 1000))
+        assert cache.get("stats", ids[0]) is not None
+        assert cache.get("stats", ids[1]) is None
+        assert cache.bytes <= cache.max_bytes
+        assert cache.stats()["evictions"] == 1
+
+    def test_skips_oversized_entries(self):
+        cache = UserDocCache(max_bytes=16 * 1024)
+        cache.put("history", "u1", {"user_id": "u1", "hands_blob": b"\x00" * 2048})
+        assert cache.get("history", "u1") is None
+        assert cache.bytes == 0
+
+    def test_put_none_drops_entry(self):
+        cache = UserDocCache()
+        cache.put("stats", "u1", stats_doc("u1"))
+        cache.put("stats", "u1", None)
+        assert cache.get("stats", "u1") is None
+        assert cache.bytes == 0
+
+    def test_entries_expire(self):
+        cache = UserDocCache(ttl=0.01)
+        cache.put("stats", "u1", stats_doc("u1"))
+        time.sleep(0.02)
+        assert cache.get("stats", "u1") is None
+        assert cache.stats()["entries"] == 0
+
+    def test_patch_updates_cached_copy_only(self):
+        cache = UserDocCache()
+        cache.patch("users", "u1", {"last_sync": "now"})
+        assert cache.get("users", "u1") is None
+        cache.put("users", "u1", {"user_id": "u1", "settings": {}})
+        cache.patch("users", "u1", {"settings": {"decks": 6}})
+        assert cache.get("users", "u1") == {"user_id": "u1", "settings": {"decks": 6}}
+
+    def test_invalidate(self):
+        cache = UserDocCache()
+        cache.put("stats", "u1", stats_doc("u1"))
+        cache.invalidate("stats", "u1")
+        assert cache.get("stats", "u1") is None
+
+    def test_disabled(self):
+        cache = UserDocCache(enabled=False)
+        cache.put("stats", "u1", stats_doc("u1"))
+        assert cache.get("stats", "u1") is None
+        assert cache.stats()["entries"] == 0
+
+
+def fake_request(db, cache):
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(db=db, user_cache=cache)))
+
+
+def add_hands(base, n):
+    stats = dict((base or {}).get("game_stats", {}))
+    stats["handsPlayed"] = stats.get("handsPlayed", 0) + n
+    return {"game_stats": stats}
+
+
+class TestConditionalUserDocWrites:
+    """Writes based on a cached copy never overwrite newer data"""
+
+    def test_stale_cached_base_is_reread(self, memory_collection, memory_db):
+        from server import update_user_doc
+
+        stats = memory_collection([{"user_id": "u1", "game_stats": {"handsPlayed": 10}, "updated_at": "t2"}], unique="user_id")
+        cache = UserDocCache()
+        # This worker cached the document before another worker wrote t2
+        cache.put("stats", "u1", {"user_id": "u1", "game_stats": {"handsPlayed": 3}, "updated_at": "t1"})
+        request = fake_request(memory_db(stats=stats), cache)
+
+        doc = asyncio.run(update_user_doc(request, "stats", "u1", lambda base: add_hands(base, 1)))
+        assert doc["game_stats"]["handsPlayed"] == 11
+        assert stats.get(user_id="u1")["game_stats"]["handsPlayed"] == 11
+        assert cache.get("stats", "u1") == doc
+
+    def test_first_write_creates_document(self, memory_collection, memory_db):
+        from server import update_user_doc
+
+        stats = memory_collection(unique="user_id")
+        request = fake_request(memory_db(stats=stats), UserDocCache())
+        doc = asyncio.run(update_user_doc(request, "stats", "u1", lambda base: add_hands(base, 2)))
+        assert stats.get(user_id="u1")["game_stats"] == {"handsPlayed": 2}
+        assert doc["updated_at"] == stats.get(user_id="u1")["updated_at"]
+
+    def test_regrade_forces_cached_writers_to_reread(self, memory_collection, memory_db):
+        from server import apply_regrade, update_user_doc
+
+        history = memory_collection([{"user_id": "u1", "hands_blob": b"old", "updated_at": "t1"}], unique="user_id")
+        worker_cache = UserDocCache()
+        worker_cache.put("history", "u1", dict(history.get(user_id="u1")))
+        db = memory_db(history=history)
+
+        result = {
+            "user_id": "u1", "updated_at": "t1", "regraded_at": "t1", "hands_blob": b"regraded", "hand_count": 0,
+            "correct_delta": 0, "mistakes": {}, "decisions_changed": 1,
+        }
+        assert asyncio.run(apply_regrade(db, UserDocCache(), result))
+        assert history.get(user_id="u1")["updated_at"] != "t1"
+
+        seen = []
+        request = fake_request(memory_db(history=history), worker_cache)
+        asyncio.run(update_user_doc(request, "history", "u1", lambda base: seen.append(base["hands_blob"]) or {}))
+        assert seen == [b"old", b"regraded"]
+
@@ -0,0 +1,113 @@
+"""
+Write-through cache of per-user documents (users, stats, history).
+
+Entries are keyed by (collection, user_id) and hold the document as it
+is stored in Mongo. Every route that writes one of these documents puts
+the new version (or patches the changed fields) after the write, so
+reads right after a sync are served from memory. Size is accounted per
+entry from its BSON length, and least-recently-used entries are evicted
+to stay under max_bytes.
+
+The cache is per process. With several workers and no sticky routing a
+user's next request may land on a worker holding an older copy, so
+entries also expire after ttl seconds to bound how stale a read can be.
+Writes never trust a cached copy blindly: the read-modify-write routes
+make their update conditional on the cached updated_at and re-read from
+Mongo on a mismatch (see update_user_doc in server.py).
+"""
+import copy
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+CACHED_COLLECTIONS = ("users", "stats", "history")
+
+
+def document_size(doc: Dict[str, Any]) -> int:
+    """Approximate memory cost of a document (its BSON length)"""
+    import bson
+
+    return len(bson.encode(doc))
+
+
+class UserDocCache:
+    """Bounded, memory-capped LRU of per-user documents"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60.0, enabled: bool = True):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max(max_bytes // 16, 1)
+        self.ttl = ttl
+        self.enabled = enabled and max_bytes > 0
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], int, float]]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, collection: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """A copy of the cached document, or None"""
+        if not self.enabled:
+            return None
+        key = (collection, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        doc, _, expires_at = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return copy.deepcopy(doc)
+
+    def put(self, collection: str, user_id: str, doc: Optional[Dict[str, Any]]) -> None:
+        """Store the current version of a document (None drops the entry)"""
+        if not self.enabled:
+            return
+        key = (collection, user_id)
+        self._remove(key)
+        if doc is None:
+            return
+        doc = copy.deepcopy(doc)
+        size = document_size(doc)
+        if size > self.max_entry_bytes:
+            return
+        while self._entries and self.bytes + size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+        self._entries[key] = (doc, size, time.monotonic() + self.ttl)
+        self.bytes += size
+
+    def patch(self, collection: str, user_id: str, fields: Dict[str, Any]) -> None:
+        """Apply a top-level $set to the cached copy, if there is one"""
+        if not self.enabled:
+            return
+        entry = self._entries.get((collection, user_id))
+        if entry is None:
+            return
+        self.put(collection, user_id, {**entry[0], **fields})
+
+    def invalidate(self, collection: str, user_id: str) -> None:
+        self._remove((collection, user_id))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[1]